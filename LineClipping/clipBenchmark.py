@@ -0,0 +1,159 @@
+""" Benchmark of the line clipping algorithms on different segment distributions
+
+inside:   most segments lie completely inside the clip region
+outside:  most segments lie completely on one side of the clip region
+crossing: most segments cross the border of the clip region
+
+The rest of every set is uniformly distributed around the clip region. All
+algorithms clip the same sets and the benchmark stops if their results differ.
+
+usage: clipBenchmark.py [--segments N] [--scalar-segments N] [--repeat N] [--seed N]
+"""
+import argparse
+import time
+import numpy as np
+
+import lineClipping
+from segmentClipping import ALGORITHMS, clipBounds, liangBarskySegment
+
+CLIP_REGION = [[200, 500], [500, 200]]
+DISTRIBUTIONS = ("inside", "outside", "crossing")
+FRACTION = 0.9  # share of the segments of the named kind
+
+
+def makeSegments(count, distribution, clipRegion, seed=0, fraction=FRACTION):
+    """ (count, 4) segments, fraction of them of the given kind (see DISTRIBUTIONS) """
+    rng = np.random.default_rng(seed)
+    x_min, y_min, x_max, y_max = clipBounds(clipRegion)
+    low, size = np.array([x_min, y_min]), np.array([x_max - x_min, y_max - y_min])
+
+    def inside(n):
+        return low + rng.random((n, 2)) * size
+
+    def around(n):
+        return low - size + rng.random((n, 2)) * 3 * size
+
+    kind = int(count * fraction)
+    if distribution == "inside":
+        segments = np.hstack((inside(kind), inside(kind)))
+    elif distribution == "outside":
+        # both end points beyond the same border
+        a, b = around(kind), around(kind)
+        axis = rng.integers(0, 2, kind)
+        rows = np.arange(kind)
+        before = rng.random(kind) < 0.5
+        for p in (a, b):
+            depth = (0.01 + rng.random(kind)) * size[axis]
+            p[rows, axis] = np.where(before, low[axis] - depth, low[axis] + size[axis] + depth)
+        segments = np.hstack((a, b))
+    elif distribution == "crossing":
+        # one end point inside, the other one outside
+        a, b = inside(kind), around(kind)
+        axis = rng.integers(0, 2, kind)
+        rows = np.arange(kind)
+        b[rows, axis] = np.where(rng.random(kind) < 0.5, low[axis] - 0.1 * size[axis],
+                                 low[axis] + 1.1 * size[axis])
+        segments = np.hstack((a, b))
+    else:
+        raise ValueError("unknown distribution %r" % distribution)
+    return rng.permutation(np.vstack((segments, np.hstack((around(count - kind), around(count - kind))))))
+
+
+def cohenSutherlandScalar(segments, clipRegion):
+    """ the per-segment path of the GUI: lineClipping.lineCase and calcNewLine """
+    clipRegion = lineClipping.normalizeClipRegion(clipRegion)
+    result = []
+    for x1, y1, x2, y2 in segments.tolist():
+        line = (lineClipping.Point([x1, y1], clipRegion), lineClipping.Point([x2, y2], clipRegion))
+        line_case = lineClipping.lineCase(line)
+        if line_case == 0:
+            result.append((x1, y1, x2, y2))
+        elif line_case == -1:
+            result.append(None)
+        else:
+            newLine = lineClipping.calcNewLine(line, line_case, clipRegion)
+            result.append(tuple(newLine[0] + newLine[1]) if newLine else None)
+    return result
+
+
+def liangBarskyScalar(segments, clipRegion):
+    bounds = clipBounds(clipRegion)
+    return [liangBarskySegment(s, bounds) for s in segments.tolist()]
+
+
+SCALAR_ALGORITHMS = {
+    "cohen-sutherland": cohenSutherlandScalar,
+    "liang-barsky": liangBarskyScalar,
+}
+
+
+def scalarToArrays(result):
+    """ clipped segments and visibility mask of a list of segments or None """
+    visible = np.array([s is not None for s in result], dtype=bool)
+    clipped = np.full((len(result), 4), np.nan)
+    if visible.any():
+        clipped[visible] = [s for s in result if s is not None]
+    return clipped, visible
+
+
+def checkResults(results, tolerance=1e-9):
+    """ raise an AssertionError if the (clipped, visible) results of the algorithms differ """
+    (name, (reference, reference_visible)), *others = results.items()
+    for other, (clipped, visible) in others:
+        if not np.array_equal(visible, reference_visible):
+            raise AssertionError("%s and %s disagree on the visibility of %d segments"
+                                 % (name, other, np.count_nonzero(visible != reference_visible)))
+        if not np.allclose(clipped[visible], reference[visible], rtol=0, atol=tolerance):
+            raise AssertionError("%s and %s clip segments differently (max. difference %g)"
+                                 % (name, other, np.abs(clipped[visible] - reference[visible]).max()))
+
+
+def bestTime(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def benchmark(segments=1000000, scalar_segments=20000, repeat=3, seed=0, clipRegion=CLIP_REGION):
+    """ print the throughput of all algorithms for all distributions, returns {(distribution, algorithm): seconds} """
+    timings = {}
+    print("%-10s %-28s %12s %14s" % ("set", "algorithm", "seconds", "segments/sec"))
+    for distribution in DISTRIBUTIONS:
+        data = makeSegments(segments, distribution, clipRegion, seed)
+        results = {}
+        for name, clip in ALGORITHMS.items():
+            seconds, results[name] = bestTime(lambda: clip(data, clipRegion), repeat)
+            timings[distribution, name] = seconds
+            print("%-10s %-28s %12.4f %14.0f" % (distribution, name + " (arrays)", seconds, len(data) / seconds))
+
+        subset = data[:scalar_segments]
+        scalar_results = {name + " (arrays)": (clipped[:scalar_segments], visible[:scalar_segments])
+                          for name, (clipped, visible) in results.items()}
+        for name, clip in SCALAR_ALGORITHMS.items():
+            seconds, result = bestTime(lambda: clip(subset, clipRegion), 1)
+            scalar_results[name] = scalarToArrays(result)
+            timings[distribution, name + " (scalar)"] = seconds
+            print("%-10s %-28s %12.4f %14.0f" % (distribution, name + " (scalar)", seconds, len(subset) / seconds))
+
+        checkResults(results)
+        checkResults(scalar_results)
+        visible = results["cohen-sutherland"][1]
+        print("%-10s %d%% visible, results match\n" % (distribution, round(100 * visible.mean())))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the line clipping algorithms")
+    parser.add_argument("--segments", type=int, default=1000000, help="segments per distribution (arrays)")
+    parser.add_argument("--scalar-segments", type=int, default=20000, help="segments per distribution (scalar)")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.segments, args.scalar_segments, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
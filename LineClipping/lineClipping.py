@@ -1,5 +1,8 @@
 from tkinter import *
 import sys
+import numpy as np
+
+from segmentClipping import ALGORITHMS, clipBounds, clipSegments, liangBarskySegment
 
 WIDTH = 700  # width of canvas
 HEIGHT = 700  # height of canvas
@@ -13,6 +16,10 @@ clipRegion = []  # clipping rectangle
 
 pointList = []  # list of points
 elementList = []  # list of elements (used by Canvas.delete(...))
+lineElements = []  # elements of every line (line and clipped line), in the order of the lines
+
+clipAlgorithm = "cohen-sutherland"  # or "liang-barsky" (--algorithm=...)
+verbose = False  # print the case of every line (--verbose)
 
 
 class Point:
@@ -21,7 +28,18 @@ class Point:
     def __init__(self, co, cr):
         self.coords = co
         # region code
-        self.reCode = 8 * (co[1] < cr[1][1]) + 4 * (co[1] > cr[0][1]) + 2 * (co[0] > cr[1][0]) + (co[0] < cr[0][0])
+        self.reCode = regionCode(co, cr)
+
+
+def regionCode(co, cr):
+    """ region code of coordinates co for the clip region cr """
+    return 8 * (co[1] < cr[1][1]) + 4 * (co[1] > cr[0][1]) + 2 * (co[0] > cr[1][0]) + (co[0] < cr[0][0])
+
+
+def log(*args):
+    """ print only in verbose mode """
+    if verbose:
+        print(*args)
 
 
 def normalizeClipRegion(clipRegion):
@@ -31,13 +49,18 @@ def normalizeClipRegion(clipRegion):
     return [[ll[0], ur[1]], [ur[0], ll[1]]]
 
 
+def drawPoint(p):
+    """ draw one point """
+    element = can.create_oval(p.coords[0] - HPSIZE, p.coords[1] - HPSIZE,
+                              p.coords[0] + HPSIZE, p.coords[1] + HPSIZE,
+                              fill=FCOLOR, outline=BCOLOR)
+    elementList.append(element)
+
+
 def drawPoints():
     """ draw oints """
     for p in pointList:
-        element = can.create_oval(p.coords[0] - HPSIZE, p.coords[1] - HPSIZE,
-                                  p.coords[0] + HPSIZE, p.coords[1] + HPSIZE,
-                                  fill=FCOLOR, outline=BCOLOR)
-        elementList.append(element)
+        drawPoint(p)
 
 
 def drawBox():
@@ -47,26 +70,43 @@ def drawBox():
         elementList.append(element)
 
 
+def drawLine(line, newLine=None):
+    """ draw a line and its clipped part (clipped here unless newLine is given), returns the elements """
+    elements = []
+    lc = lineCase(line)
+    if lc == 0:
+        log("line complete inside rectangle!")
+        elements.append(can.create_line(line[0].coords, line[1].coords, width=CLSIZE))
+    elif lc == -1:
+        log("line not visible!")
+        elements.append(can.create_line(line[0].coords, line[1].coords, width=1))
+    else:
+        log("need further tests... linecode: ", lc)
+        elements.append(can.create_line(line[0].coords, line[1].coords, width=1))
+        if newLine is None:
+            newLine = clipLine(line, lc, clipRegion)
+        if newLine:
+            elements.append(can.create_line(newLine, width=CLSIZE))
+    elementList.extend(elements)
+    return elements
+
+
 def drawLines():
-    """ use third and next points in pointlist to draw lines"""
-    for line in zip(pointList[2::2], pointList[3::2]):
-        lc = lineCase(line)
-        if lc == 0:
-            print("line complete inside rectangle!")
-            element = can.create_line(line[0].coords, line[1].coords, width=CLSIZE)
-            elementList.append(element)
-        elif lc == -1:
-            print("line not visible!")
-            element = can.create_line(line[0].coords, line[1].coords, width=1)
-            elementList.append(element)
-        else:
-            print("need further tests... linecode: ", lc)
-            element = can.create_line(line[0].coords, line[1].coords, width=1)
-            elementList.append(element)
-            newLine = calcNewLine(line, lc, clipRegion)
-            if newLine:
-                element = can.create_line(newLine, width=CLSIZE)
-                elementList.append(element)
+    """ use third and next points in pointlist to draw lines (all lines are clipped at once) """
+    removed = set(e for elements in lineElements for e in elements)
+    can.delete(*removed)
+    elementList[:] = [e for e in elementList if e not in removed]
+    del lineElements[:]
+
+    lines = list(zip(pointList[2::2], pointList[3::2]))
+    if not lines:
+        return
+    for p in pointList[2:]:
+        p.reCode = regionCode(p.coords, clipRegion)
+    segments = np.array([line[0].coords + line[1].coords for line in lines], dtype=float)
+    clipped, visible = clipSegments(segments, clipRegion, clipAlgorithm)
+    for line, segment, v in zip(lines, clipped.tolist(), visible):
+        lineElements.append(drawLine(line, [segment[:2], segment[2:]] if v else []))
 
 
 def lineCase(line):
@@ -153,6 +193,21 @@ def calcNewLine(line, line_case, clip_region):
     return []
 
 
+def calcNewLineLiangBarsky(line, clip_region):
+    """ Calculate clipped line with the Liang-Barsky algorithm """
+    segment = liangBarskySegment(line[0].coords + line[1].coords, clipBounds(clip_region))
+    if segment is None:
+        return []
+    return [list(segment[:2]), list(segment[2:])]
+
+
+def clipLine(line, line_case, clip_region):
+    """ Calculate clipped line with the selected algorithm """
+    if clipAlgorithm == "liang-barsky":
+        return calcNewLineLiangBarsky(line, clip_region)
+    return calcNewLine(line, line_case, clip_region)
+
+
 def quit(root=None):
     """ quit programm """
     if root == None:
@@ -164,6 +219,8 @@ def quit(root=None):
 def draw():
     """ draw elements """
     can.delete(*elementList)
+    del elementList[:]
+    del lineElements[:]
     drawPoints()
     drawBox()
     drawLines()
@@ -172,35 +229,46 @@ def draw():
 def clearAll():
     """ clear all (point list and canvas) """
     can.delete(*elementList)
+    del elementList[:]
+    del lineElements[:]
     del pointList[:]
 
 
 def mouseEvent(event):
-    """ process mouse events """
+    """ process mouse events, only the new point and line are drawn """
     # print "left mouse button clicked at ", event.x, event.y
     global clipRegion
     p = [event.x, event.y]
     if len(pointList) < 2:
         point = Point(p, [[0, 0], [WIDTH, HEIGHT]])
-    elif len(pointList) == 2:
-        clipRegion = normalizeClipRegion([pointList[0].coords, pointList[1].coords])
-        point = Point(p, clipRegion)
     else:
         point = Point(p, clipRegion)
 
     pointList.append(point)
-    draw()
+    drawPoint(point)
+    if len(pointList) == 2:
+        # new clip rectangle: draw it and clip all lines again
+        clipRegion = normalizeClipRegion([pointList[0].coords, pointList[1].coords])
+        drawBox()
+        drawLines()
+    elif len(pointList) > 2 and len(pointList) % 2 == 0:
+        lineElements.append(drawLine(pointList[-2:]))
 
 
 if __name__ == "__main__":
     # check parameters
-    if len(sys.argv) != 1:
-        print("LineClipping")
-        sys.exit(-1)
+    for arg in sys.argv[1:]:
+        if arg.startswith("--algorithm=") and arg.split("=", 1)[1] in ALGORITHMS:
+            clipAlgorithm = arg.split("=", 1)[1]
+        elif arg == "--verbose":
+            verbose = True
+        else:
+            print("LineClipping [--algorithm=%s] [--verbose]" % "|".join(ALGORITHMS))
+            sys.exit(-1)
 
     # create main window
     mw = Tk()
-    mw._root().wm_title("Line clipping (Cohen-Sutherland Algorithm)")
+    mw._root().wm_title("Line clipping (%s Algorithm)" % clipAlgorithm.title())
 
     # create and position canvas and buttons
     cFr = Frame(mw, width=WIDTH, height=HEIGHT, relief="sunken", bd=1)
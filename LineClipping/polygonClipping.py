@@ -0,0 +1,137 @@
+""" Clipping of many polygons at once against a rectangular clip region (no GUI)
+
+Polygons are stored in flat arrays: the (V, 2) vertices of all polygons one
+after another and offsets with the start of every polygon, polygon i is
+vertices[offsets[i]:offsets[i + 1]]. The clip region is given by two opposite
+corners in any order (see segmentClipping).
+"""
+import multiprocessing as mp
+import numpy as np
+
+from segmentClipping import clipBounds, regionCodes
+
+PARALLEL_MIN_VERTICES = 1000000  # smaller inputs are clipped in the calling process
+
+
+def expandRanges(starts, counts):
+    """ concatenation of the index ranges start:start+count """
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.arange(total) - np.repeat(ends - counts, counts) + np.repeat(starts, counts)
+
+
+def polygonsToArrays(polygons):
+    """ flat vertices and offsets of a list of (n, 2) polygons """
+    counts = [len(p) for p in polygons]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    vertices = np.concatenate([np.reshape(p, (-1, 2)) for p in polygons]).astype(float) if polygons else np.empty((0, 2))
+    return vertices.reshape(-1, 2), offsets
+
+
+def arraysToPolygons(vertices, offsets):
+    """ list of the (n, 2) polygons of flat vertices and offsets """
+    return [vertices[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def clipBorder(vertices, offsets, axis, border, keep_greater):
+    """ clip all polygons against one border line (Sutherland-Hodgman step)
+
+        Every edge S -> E of a polygon emits the intersection with the border if it
+        crosses the border, followed by E if E is inside. """
+    counts = np.diff(offsets)
+    previous = np.arange(len(vertices)) - 1
+    first = offsets[:-1][counts > 0]
+    previous[first] = first + counts[counts > 0] - 1
+
+    values = vertices[:, axis]
+    # inside as in the region codes: points on the border are inside
+    inside = values >= border if keep_greater else values <= border
+    e_in, s_in = inside, inside[previous]
+    crossing = e_in != s_in
+    emitted = e_in.astype(np.int64) + crossing
+
+    starts = np.cumsum(emitted) - emitted
+    result = np.empty((int(emitted.sum()), 2))
+    s, e = vertices[previous[crossing]], vertices[crossing]
+    t = (border - s[:, axis]) / (e[:, axis] - s[:, axis])
+    intersection = s + t[:, np.newaxis] * (e - s)
+    intersection[:, axis] = border
+    result[starts[crossing]] = intersection
+    result[starts[e_in] + crossing[e_in]] = vertices[e_in]
+
+    emitted_sum = np.concatenate(([0], np.cumsum(emitted)))
+    return result, emitted_sum[offsets]
+
+
+def sutherlandHodgman(vertices, offsets, bounds):
+    """ clip all polygons against the four borders of the clip region, polygons outside become empty """
+    x_min, y_min, x_max, y_max = bounds
+    for axis, border, keep_greater in ((0, x_min, True), (0, x_max, False), (1, y_min, True), (1, y_max, False)):
+        vertices, offsets = clipBorder(vertices, offsets, axis, border, keep_greater)
+    return vertices, offsets
+
+
+def clipPolygonChunk(task):
+    """ clip the polygons (vertices, offsets) against bounds, using region codes for trivial accept/reject """
+    vertices, offsets, bounds = task
+    counts = np.diff(offsets)
+    codes = regionCodes(vertices[:, 0], vertices[:, 1], bounds)
+
+    # polygons with all vertices inside are kept, polygons with all vertices on the same outer side dropped
+    nonempty = counts > 0
+    all_codes = np.zeros(len(counts), dtype=np.uint8)
+    any_codes = np.zeros(len(counts), dtype=np.uint8)
+    if nonempty.any():
+        all_codes[nonempty] = np.bitwise_and.reduceat(codes, offsets[:-1][nonempty])
+        any_codes[nonempty] = np.bitwise_or.reduceat(codes, offsets[:-1][nonempty])
+    accept = nonempty & (any_codes == 0)
+    todo = np.flatnonzero(nonempty & (any_codes != 0) & (all_codes == 0))
+
+    # clip the others
+    todo_vertices = vertices[expandRanges(offsets[todo], counts[todo])]
+    todo_offsets = np.concatenate(([0], np.cumsum(counts[todo]))).astype(np.int64)
+    clipped, clipped_offsets = sutherlandHodgman(todo_vertices, todo_offsets, bounds)
+    clipped_counts = np.diff(clipped_offsets)
+
+    result_counts = np.where(accept, counts, 0)
+    result_counts[todo] = clipped_counts
+    result_offsets = np.concatenate(([0], np.cumsum(result_counts))).astype(np.int64)
+    result = np.empty((int(result_offsets[-1]), 2))
+    result[expandRanges(result_offsets[:-1][accept], counts[accept])] = \
+        vertices[expandRanges(offsets[:-1][accept], counts[accept])]
+    result[expandRanges(result_offsets[todo], clipped_counts)] = clipped
+    return result, result_offsets
+
+
+def splitPolygons(offsets, parts):
+    """ polygon index boundaries which split the polygons into parts with similar vertex counts """
+    targets = np.linspace(0, offsets[-1], parts + 1)
+    bounds = np.unique(np.searchsorted(offsets, targets))
+    bounds[0], bounds[-1] = 0, len(offsets) - 1
+    return np.unique(bounds)
+
+
+def clipPolygons(vertices, offsets, clipRegion, workers=1):
+    """ clip all polygons (flat vertices and offsets) against the clip region
+
+        Returns the vertices and offsets of the clipped polygons; polygon i of the result
+        is the clipped polygon i (empty if it is not visible). With workers > 1, inputs of
+        at least PARALLEL_MIN_VERTICES vertices are split across a process pool. """
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    bounds = clipBounds(clipRegion)
+    if workers <= 1 or len(vertices) < PARALLEL_MIN_VERTICES:
+        return clipPolygonChunk((vertices, offsets, bounds))
+
+    parts = splitPolygons(offsets, workers * 4)
+    tasks = [(vertices[offsets[a]:offsets[b]], offsets[a:b + 1] - offsets[a], bounds)
+             for a, b in zip(parts[:-1], parts[1:])]
+    with mp.Pool(workers) as pool:
+        results = pool.map(clipPolygonChunk, tasks)
+
+    result_offsets = [np.zeros(1, dtype=np.int64)]
+    for chunk_vertices, chunk_offsets in results:
+        result_offsets.append(chunk_offsets[1:] + result_offsets[-1][-1])
+    return np.concatenate([r[0] for r in results]), np.concatenate(result_offsets)
@@ -0,0 +1,138 @@
+""" Clipping of many line segments at once (no GUI)
+
+Segments are (N, 4) arrays of rows x1, y1, x2, y2. The clip region is given
+by two opposite corners in any order, e.g. the clipRegion of lineClipping.
+Region codes use the bits of lineClipping.Point.
+
+cohenSutherland and liangBarsky clip arrays of segments (selectable by name
+with clipSegments), liangBarskySegment clips a single segment.
+"""
+import numpy as np
+
+# region code bits
+X_MIN = 1  # left of the region
+X_MAX = 2  # right of the region
+Y_MAX = 4  # y larger than the region
+Y_MIN = 8  # y smaller than the region
+
+
+def clipBounds(clipRegion):
+    """ x_min, y_min, x_max, y_max of a clip region given by two opposite corners """
+    (ax, ay), (bx, by) = clipRegion
+    return min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
+
+
+def regionCodes(x, y, bounds):
+    """ region codes of all points (x, y) """
+    x_min, y_min, x_max, y_max = bounds
+    return (Y_MIN * (y < y_min) | Y_MAX * (y > y_max) | X_MAX * (x > x_max) | X_MIN * (x < x_min)).astype(np.uint8)
+
+
+def cohenSutherland(segments, clipRegion):
+    """ Cohen-Sutherland clipping of all segments
+
+        Segments with both end points inside are accepted and segments with both end
+        points on the same outer side are rejected in bulk. The others are clipped in
+        masked passes: every pass moves one outer end point of every remaining segment
+        onto the border of its lowest region code bit (at most 4 passes per end point).
+        Returns the clipped segments (NaN rows for invisible ones) and the visibility mask. """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    bounds = clipBounds(clipRegion)
+    x_min, y_min, x_max, y_max = bounds
+    clipped = segments.copy()
+    code1 = regionCodes(segments[:, 0], segments[:, 1], bounds)
+    code2 = regionCodes(segments[:, 2], segments[:, 3], bounds)
+
+    # segments which need intersection tests
+    todo = np.flatnonzero(((code1 | code2) != 0) & ((code1 & code2) == 0))
+    while len(todo):
+        x1, y1, x2, y2 = segments[todo].T
+        c1, c2 = code1[todo], code2[todo]
+
+        # clip the first end point if it is outside, otherwise the second one
+        first = c1 != 0
+        code = np.where(first, c1, c2)
+        lowest_bit = code & (~code + np.uint8(1))  # borders are handled in the order of lineClipping.calcNewLine
+        x, y = np.empty(len(todo)), np.empty(len(todo))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for bit, border, vertical in ((X_MIN, x_min, True), (X_MAX, x_max, True),
+                                          (Y_MAX, y_max, False), (Y_MIN, y_min, False)):
+                sel = lowest_bit == bit
+                if vertical:
+                    y[sel] = y1[sel] + (y2[sel] - y1[sel]) * (border - x1[sel]) / (x2[sel] - x1[sel])
+                    x[sel] = border
+                else:
+                    x[sel] = x1[sel] + (x2[sel] - x1[sel]) * (border - y1[sel]) / (y2[sel] - y1[sel])
+                    y[sel] = border
+
+        new_code = regionCodes(x, y, bounds)
+        rows = todo[first]
+        clipped[rows, 0], clipped[rows, 1] = x[first], y[first]
+        code1[rows] = new_code[first]
+        rows = todo[~first]
+        clipped[rows, 2], clipped[rows, 3] = x[~first], y[~first]
+        code2[rows] = new_code[~first]
+
+        c1, c2 = code1[todo], code2[todo]
+        todo = todo[((c1 | c2) != 0) & ((c1 & c2) == 0)]
+
+    visible = (code1 | code2) == 0
+    clipped[~visible] = np.nan
+    return clipped, visible
+
+
+def liangBarskySegment(segment, bounds):
+    """ Liang-Barsky clipping of one segment (x1, y1, x2, y2), returns the clipped segment or None """
+    x1, y1, x2, y2 = segment
+    x_min, y_min, x_max, y_max = bounds
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+    # segment point x1 + t * dx is inside border k for p * t <= q
+    for p, q in ((-dx, x1 - x_min), (dx, x_max - x1), (-dy, y1 - y_min), (dy, y_max - y1)):
+        if p == 0:
+            if q < 0:
+                # parallel to and outside of this border
+                return None
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+        if t0 > t1:
+            return None
+    return x1 + t0 * dx, y1 + t0 * dy, x1 + t1 * dx, y1 + t1 * dy
+
+
+def liangBarsky(segments, clipRegion):
+    """ Liang-Barsky clipping of all segments: the parameter interval [0, 1] of every
+        segment is narrowed by the four borders at once, without intersection loops.
+        Returns the clipped segments (NaN rows for invisible ones) and the visibility mask. """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    x_min, y_min, x_max, y_max = clipBounds(clipRegion)
+    x1, y1, x2, y2 = segments.T
+    dx, dy = x2 - x1, y2 - y1
+    p = np.stack((-dx, dx, -dy, dy))
+    q = np.stack((x1 - x_min, x_max - x1, y1 - y_min, y_max - y1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = q / p
+    t0 = np.max(np.where(p < 0, t, 0.0), axis=0, initial=0.0)
+    t1 = np.min(np.where(p > 0, t, 1.0), axis=0, initial=1.0)
+    visible = ~((p == 0) & (q < 0)).any(axis=0) & (t0 <= t1)
+
+    clipped = np.stack((x1 + t0 * dx, y1 + t0 * dy, x1 + t1 * dx, y1 + t1 * dy), axis=1)
+    clipped[~visible] = np.nan
+    return clipped, visible
+
+
+# clipping algorithms by name (see clipSegments)
+ALGORITHMS = {
+    "cohen-sutherland": cohenSutherland,
+    "liang-barsky": liangBarsky,
+}
+
+
+def clipSegments(segments, clipRegion, algorithm="cohen-sutherland"):
+    """ clip all segments with the selected algorithm, returns the clipped segments and the visibility mask """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("unknown clipping algorithm %r (choose from %s)" % (algorithm, ", ".join(ALGORITHMS)))
+    return ALGORITHMS[algorithm](segments, clipRegion)
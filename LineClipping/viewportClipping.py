@@ -0,0 +1,96 @@
+""" Clipping of one segment set against many clip regions (viewports, tiles)
+
+SegmentGrid enters every segment once into all cells of a uniform grid which
+its bounding box overlaps. A clip region then only looks at the segments of
+the cells it overlaps, so the work per region depends on the segments near
+it, not on the size of the whole set. Segments whose bounding box covers more
+than MAX_SEGMENT_CELLS cells (long diagonals) are kept in a separate list and
+tested against every clip region by their bounding box instead.
+"""
+import numpy as np
+
+from polygonClipping import expandRanges
+from segmentClipping import clipBounds, clipSegments
+
+MAX_CELLS = 2 ** 22  # upper limit for the number of grid cells
+MAX_SEGMENT_CELLS = 64  # segments covering more cells are not entered into the grid
+
+
+class SegmentGrid:
+    def __init__(self, segments, cell_size=None):
+        """ build the index of (N, 4) segments, the cell size defaults to the typical segment size """
+        self.segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+        x1, y1, x2, y2 = self.segments.T
+        self.box_low = np.stack((np.minimum(x1, x2), np.minimum(y1, y2)), axis=1)
+        self.box_high = np.stack((np.maximum(x1, x2), np.maximum(y1, y2)), axis=1)
+        if not len(self.segments):
+            self.low, self.cell_size, self.dims = np.zeros(2), 1.0, np.ones(2, dtype=np.int64)
+            self.cell_keys = self.cell_start = self.cell_count = self.entries = np.empty(0, dtype=np.int64)
+            self.large = np.empty(0, dtype=np.int64)
+            return
+
+        self.low = self.box_low.min(axis=0)
+        extent = max(float((self.box_high.max(axis=0) - self.low).max()), 1e-12)
+        if cell_size is None:
+            # segments should overlap few cells, and the cells should not be much fewer than the segments
+            cell_size = min(float(np.median((self.box_high - self.box_low).max(axis=1))) * 2,
+                            extent / np.sqrt(len(self.segments)))
+        cell_size = max(cell_size, extent / np.sqrt(MAX_CELLS), 1e-12)
+        self.cell_size = cell_size
+        self.dims = np.floor(extent / cell_size).astype(np.int64) + np.ones(2, dtype=np.int64)
+
+        # one entry per overlapped cell of every segment
+        first, last = self.cell(self.box_low), self.cell(self.box_high)
+        width = last[:, 0] - first[:, 0] + 1
+        counts = width * (last[:, 1] - first[:, 1] + 1)
+        self.large = np.flatnonzero(counts > MAX_SEGMENT_CELLS)
+        counts[self.large] = 0
+        segment = np.repeat(np.arange(len(self.segments)), counts)
+        local = expandRanges(np.zeros(len(counts), dtype=np.int64), counts)
+        cells = first[segment] + np.stack((local % width[segment], local // width[segment]), axis=1)
+        keys = cells[:, 1] * self.dims[0] + cells[:, 0]
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        self.entries = segment[order]
+        start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.cell_keys = keys[start]
+        self.cell_start = start
+        self.cell_count = np.diff(np.r_[start, len(keys)])
+
+    def cell(self, points):
+        """ integer grid cells of (N, 2) points, clamped to the grid """
+        cells = np.floor((np.asarray(points, dtype=float) - self.low) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.dims - 1)
+
+    def candidates(self, clipRegion):
+        """ indices of all segments whose bounding box overlaps the clip region """
+        x_min, y_min, x_max, y_max = clipBounds(clipRegion)
+        segments = self.large
+        if len(self.cell_keys):
+            (cx0, cy0), (cx1, cy1) = self.cell([[x_min, y_min], [x_max, y_max]])
+            columns = np.arange(cx0, cx1 + 1)
+            keys = (np.arange(cy0, cy1 + 1)[:, np.newaxis] * self.dims[0] + columns).ravel()
+
+            found = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+            found = found[self.cell_keys[found] == keys]
+            in_cells = self.entries[expandRanges(self.cell_start[found], self.cell_count[found])]
+            segments = np.unique(np.concatenate((in_cells, segments)))
+        overlap = ((self.box_low[segments] <= [x_max, y_max]).all(axis=1) &
+                   (self.box_high[segments] >= [x_min, y_min]).all(axis=1))
+        return segments[overlap]
+
+    def clip(self, clipRegion, algorithm="cohen-sutherland"):
+        """ indices and clipped segments of all segments visible in the clip region """
+        segments = self.candidates(clipRegion)
+        clipped, visible = clipSegments(self.segments[segments], clipRegion, algorithm)
+        return segments[visible], clipped[visible]
+
+    def clipViewports(self, clipRegions, algorithm="cohen-sutherland"):
+        """ list of (indices, clipped segments) for every clip region """
+        return [self.clip(clipRegion, algorithm) for clipRegion in clipRegions]
+
+
+def clipViewports(segments, clipRegions, algorithm="cohen-sutherland", cell_size=None):
+    """ clip the segments against every clip region, returns a list of (indices, clipped segments) """
+    return SegmentGrid(segments, cell_size).clipViewports(clipRegions, algorithm)
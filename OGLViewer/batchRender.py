@@ -0,0 +1,129 @@
+""" Batch rendering of turntable images for all point files of a directory
+
+Every model is rendered from `views` directions; view k is k presses of the
+rotation key (x, y or z) of the viewer, i.e. glRotatef(22.5 * k, axis).
+Files are distributed over a process pool; every worker process handles
+a single file before it is replaced, so its memory is returned after each model.
+Images are named after the whole file name (bunny.raw_00.png), so models with
+the same name in different formats do not overwrite each other. With
+--max-points the files are read chunk by chunk and only the subset is kept.
+
+usage: batchRender.py directory [output_directory] [--views N] [--axis x|y|z]
+                      [--workers N] [--size W H] [--point-size N] [--max-points N]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+
+from pointLoader import iter_chunks, load_point_file
+from pointRasterizer import render, write_png, key_rotation, AXES
+from quantizedPoints import QUANTIZED_SUFFIX, iter_quantized_chunks, read_header, quantization, dequantize
+
+POINT_FILES = (".raw", QUANTIZED_SUFFIX)
+VIEWS = 16  # one full turn in 22.5 degree steps
+
+
+def find_point_files(directory):
+   """ all point files of a directory, sorted by name """
+   return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                 if name.endswith(POINT_FILES))
+
+
+def count_points(file):
+   """ number of points of a point file without loading it """
+   if file.endswith(QUANTIZED_SUFFIX):
+      with open(file, 'rb') as f:
+         return int(read_header(f)['count'])
+   with open(file, 'rb') as f:
+      return sum(1 for line in f if line.strip())
+
+
+def iter_point_chunks(file):
+   """ float32 (n, 3) chunks of a .raw or quantized point file """
+   if not file.endswith(QUANTIZED_SUFFIX):
+      yield from iter_chunks(file)
+      return
+   with open(file, 'rb') as f:
+      header = read_header(f)
+   offset, step = quantization(header['low'], header['high'])
+   for positions, _ in iter_quantized_chunks(file):
+      yield dequantize(positions, offset, step)
+
+
+def load_subset(file, max_points):
+   """ evenly strided subset of at most about max_points points, read chunk by chunk """
+   stride = max(int(np.ceil(count_points(file) / max_points)), 1)
+   subset, start = [], 0
+   for chunk in iter_point_chunks(file):
+      subset.append(chunk[-start % stride::stride])
+      start += len(chunk)
+   return np.concatenate(subset) if subset else np.empty((0, 3), np.float32)
+
+
+def render_turntable(task):
+   """ render all views of one file, returns (file, number of points, seconds, error) """
+   file, output_directory, views, axis, size, point_size, max_points = task
+   start = time.time()
+   try:
+      # no sidecar caches in the input directory
+      points = load_subset(file, max_points) if max_points else load_point_file(file, use_cache=False)
+      points = np.ascontiguousarray(points, dtype=np.float32)
+
+      name = os.path.basename(file)
+      for view in range(views):
+         image = render(points, size[0], size[1], key_rotation(axis * view), point_size)
+         write_png(image, os.path.join(output_directory, "%s_%02d.png" % (name, view)))
+      return file, len(points), time.time() - start, None
+   except Exception as e:
+      return file, 0, time.time() - start, e
+
+
+def render_directory(directory, output_directory, views=VIEWS, axis='y', workers=None, size=(500, 500),
+                     point_size=2, max_points=None):
+   """ render turntables of all point files of a directory in parallel, reports progress and timing """
+   files = find_point_files(directory)
+   os.makedirs(output_directory, exist_ok=True)
+   tasks = [(file, output_directory, views, axis, size, point_size, max_points) for file in files]
+
+   start = time.time()
+   total_points, busy, failed = 0, 0.0, []
+   with mp.Pool(workers, maxtasksperchild=1) as pool:
+      for done, (file, count, seconds, error) in enumerate(pool.imap_unordered(render_turntable, tasks), 1):
+         busy += seconds
+         if error is not None:
+            failed.append(file)
+            print("[%d/%d] %s: failed (%s)" % (done, len(files), file, error))
+         else:
+            total_points += count
+            print("[%d/%d] %s: %d points, %d views, %.2f sec" % (done, len(files), file, count, views, seconds))
+
+   elapsed = time.time() - start
+   print("\n%d files (%d failed), %d views, %d points" % (len(files), len(failed), views * (len(files) - len(failed)),
+                                                           total_points))
+   print("Time elapsed: %.2f sec (%.2f sec in workers, %.2f files/sec)"
+         % (elapsed, busy, len(files) / elapsed if elapsed > 0 else 0))
+   return failed
+
+
+def main():
+   parser = argparse.ArgumentParser(description="render turntable images of all point files of a directory")
+   parser.add_argument("directory")
+   parser.add_argument("output_directory", nargs="?", default="turntables")
+   parser.add_argument("--views", type=int, default=VIEWS)
+   parser.add_argument("--axis", default='y', choices=sorted(AXES))
+   parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+   parser.add_argument("--size", type=int, nargs=2, default=(500, 500), metavar=("W", "H"))
+   parser.add_argument("--point-size", type=int, default=2)
+   parser.add_argument("--max-points", type=int, default=None, help="render at most this many points per model")
+   args = parser.parse_args()
+
+   failed = render_directory(args.directory, args.output_directory, args.views, args.axis, args.workers,
+                             args.size, args.point_size, args.max_points)
+   if failed:
+      raise SystemExit(1)
+
+
+if __name__ == "__main__":
+   main()
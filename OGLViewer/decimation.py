@@ -0,0 +1,140 @@
+""" Reduction of the point density of (N, 3) point clouds
+
+voxel_downsample keeps one point (or the centroid) per occupied voxel,
+poisson_disk_thin keeps a subset in which no two points are closer than a radius.
+
+usage: decimation.py input output [--voxel SIZE] [--poisson RADIUS] [--centroid]
+       (output: .raw text or quantized .qpc file)
+"""
+import argparse
+import numpy as np
+
+from pointLoader import load_point_file, save_points
+from quantizedPoints import write_quantized, QUANTIZED_SUFFIX
+
+POISSON_ATTEMPTS = 30  # candidates tried per grid cell
+
+
+def grid_keys(points, cell_size, padding=0):
+   """ integer cell of every point and a linear key of it (cells are shifted by padding) """
+   low = points.min(axis=0)
+   cells = np.floor((points - low) / cell_size).astype(np.int64) + padding
+   dims = cells.max(axis=0) + 1 + padding
+   if np.prod(dims.astype(float)) >= 2 ** 62:
+      raise ValueError("cell size %g is too small for the extent of the points" % cell_size)
+   keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+   return cells, keys, dims
+
+
+def voxel_downsample(points, voxel_size, centroid=False):
+   """ one point per occupied voxel of edge length voxel_size:
+       the first point of the voxel (an original point) or the centroid of its points """
+   points = np.asarray(points)
+   if not len(points):
+      return points
+   _, keys, _ = grid_keys(points, voxel_size)
+   order = np.argsort(keys, kind='stable')
+   keys = keys[order]
+   first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+   if not centroid:
+      return np.ascontiguousarray(points[order[first]])
+   sums = np.add.reduceat(points[order].astype(np.float64), first, axis=0)
+   counts = np.diff(np.r_[first, len(keys)])
+   return (sums / counts[:, np.newaxis]).astype(points.dtype)
+
+
+def poisson_disk_thin(points, radius, attempts=POISSON_ATTEMPTS, seed=0):
+   """ subset of the points with a distance of at least radius between any two of them
+
+       The cells of a grid with edge radius / sqrt(3) hold at most one sample each and
+       conflicting samples lie at most 2 cells apart. Cells whose coordinates are equal
+       modulo 5 therefore never conflict and are processed together (125 phases).
+       Every accepted sample is entered once into the cells around it, so testing a
+       candidate only compares it with the samples stored in its own cell. """
+   points = np.asarray(points)
+   if not len(points):
+      return points
+   cell_size = radius / np.sqrt(3)
+   cells, keys, dims = grid_keys(points, cell_size, padding=2)
+
+   # points of every cell in random order
+   shuffle = np.random.default_rng(seed).permutation(len(points))
+   order = shuffle[np.argsort(keys[shuffle], kind='stable')]
+   sorted_keys = keys[order]
+   first = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+   cell_keys = sorted_keys[first]
+   cell_counts = np.diff(np.r_[first, len(order)])
+   cell_coords = cells[order[first]]
+   phase = (cell_coords % 5) @ np.array([25, 5, 1])
+
+   offsets = np.stack(np.meshgrid(*[np.arange(-2, 3)] * 3, indexing='ij'), -1).reshape(-1, 3)
+   offsets = offsets[(np.abs(offsets) < 2).any(axis=1)]  # corner cells are at least radius away
+   offsets = offsets[np.abs(offsets).any(axis=1)]  # candidate cells have no sample themselves
+   offset_keys = (offsets[:, 0] * dims[1] + offsets[:, 1]) * dims[2] + offsets[:, 2]
+
+   # cells of every phase which have no sample yet
+   by_phase = np.argsort(phase, kind='stable')
+   bounds = np.searchsorted(phase[by_phase], np.arange(126))
+   open_cells = [by_phase[bounds[p]:bounds[p + 1]] for p in range(125)]
+
+   sample = np.full(len(cell_keys), -1)  # accepted point of every cell
+   # positions of the samples in the neighbouring cells of every cell (infinitely far away for the padding)
+   near_samples = np.full((len(cell_keys), 8, 3), np.inf, dtype=np.promote_types(points.dtype, np.float32))
+   near_count = np.zeros(len(cell_keys), dtype=np.int64)
+   for attempt in range(min(attempts, cell_counts.max())):
+      for p in range(125):
+         candidates = open_cells[p][cell_counts[open_cells[p]] > attempt]
+         if not candidates.size:
+            continue
+         point_index = order[first[candidates] + attempt]
+         position = points[point_index]
+
+         # samples in the neighbouring cells
+         difference = near_samples[candidates, :near_count[candidates].max()] - position[:, np.newaxis]
+         conflict = ((difference * difference).sum(axis=2) < radius * radius).any(axis=1)
+
+         accepted = candidates[~conflict]
+         sample[accepted] = point_index[~conflict]
+         open_cells[p] = candidates[conflict]
+
+         # enter the new samples into their occupied neighbour cells (cells of a phase share no neighbours)
+         neighbour_keys = cell_keys[accepted, np.newaxis] + offset_keys
+         neighbour = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+         source, slot = np.nonzero(cell_keys[neighbour] == neighbour_keys)
+         neighbour = neighbour[source, slot]
+         if near_count[neighbour].max(initial=0) == near_samples.shape[1]:
+            near_samples = np.concatenate((near_samples, np.full_like(near_samples, np.inf)), axis=1)
+         near_samples[neighbour, near_count[neighbour]] = position[~conflict][source]
+         near_count[neighbour] += 1
+   return np.ascontiguousarray(points[np.sort(sample[sample >= 0])])
+
+
+def decimate(points, voxel_size=None, poisson_radius=None, centroid=False):
+   """ apply voxel downsampling and/or Poisson disk thinning (in this order) """
+   if voxel_size:
+      points = voxel_downsample(points, voxel_size, centroid)
+   if poisson_radius:
+      points = poisson_disk_thin(points, poisson_radius)
+   return points
+
+
+def main():
+   parser = argparse.ArgumentParser(description="reduce the point density of a point file")
+   parser.add_argument("input")
+   parser.add_argument("output", help=".raw or " + QUANTIZED_SUFFIX + " file")
+   parser.add_argument("--voxel", type=float, help="voxel edge length")
+   parser.add_argument("--poisson", type=float, help="minimum distance between points")
+   parser.add_argument("--centroid", action="store_true", help="keep voxel centroids instead of original points")
+   args = parser.parse_args()
+
+   points = load_point_file(args.input)
+   result = decimate(points, args.voxel, args.poisson, args.centroid)
+   if args.output.endswith(QUANTIZED_SUFFIX):
+      write_quantized(args.output, [result], result.min(axis=0), result.max(axis=0), len(result))
+   else:
+      save_points(args.output, result)
+   print("kept", len(result), "of", len(points), "points")
+
+
+if __name__ == "__main__":
+   main()
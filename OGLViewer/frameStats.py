@@ -0,0 +1,99 @@
+""" Lightweight per-frame instrumentation for the OpenGL viewers
+(also imported by bspline/bsplineViewer.py from this directory)
+
+Collects frame times, draw calls, vertex counts, uploaded bytes and redundant
+redraws (frames drawn although nothing changed since the previous frame),
+prints rolling percentiles every report_interval seconds and optionally
+writes one CSV row per frame.
+"""
+import collections
+import csv
+import time
+import numpy as np
+
+WINDOW = 300  # frames in the rolling window
+REPORT_INTERVAL = 2.0  # seconds between reports
+
+
+class FrameStats:
+   def __init__(self, name, enabled=False, csv_file=None, window=WINDOW, report_interval=REPORT_INTERVAL):
+      self.name = name
+      self.enabled = enabled
+      self.report_interval = report_interval
+      self.frame_times = collections.deque(maxlen=window)
+      self.frame = 0
+      self.redundant = 0
+      self.dirty = True
+      self._start = None
+      self._last_report = time.perf_counter()
+      self._reset_frame()
+      self.upload_bytes = 0
+
+      self._csv = None
+      self._writer = None
+      if csv_file:
+         self._csv = open(csv_file, "w", newline="")
+         self._writer = csv.writer(self._csv)
+         self._writer.writerow(["frame", "time", "frame_ms", "draw_calls", "vertices", "upload_bytes", "redundant"])
+
+   def _reset_frame(self):
+      self.draw_calls = 0
+      self.vertices = 0
+
+   def toggle(self):
+      self.enabled = not self.enabled
+      print("%s: frame statistics %s" % (self.name, "on" if self.enabled else "off"))
+
+   def mark_dirty(self):
+      """ the scene changed, the next frame is needed """
+      self.dirty = True
+
+   def begin_frame(self):
+      self._start = time.perf_counter()
+      self._reset_frame()
+
+   def draw(self, vertices, calls=1):
+      self.draw_calls += calls
+      self.vertices += int(vertices)
+
+   def upload(self, nbytes):
+      """ count uploaded bytes, uploads between frames are counted for the next frame """
+      self.upload_bytes += int(nbytes)
+
+   def end_frame(self):
+      if self._start is None:
+         return
+      now = time.perf_counter()
+      frame_time = now - self._start
+      self._start = None
+      redundant = not self.dirty
+      self.dirty = False
+      self.frame += 1
+      self.redundant += redundant
+      self.frame_times.append(frame_time)
+
+      if self._writer is not None:
+         self._writer.writerow([self.frame, "%.6f" % now, "%.3f" % (frame_time * 1000), self.draw_calls,
+                                self.vertices, self.upload_bytes, int(redundant)])
+      if self.enabled and now - self._last_report >= self.report_interval:
+         self._last_report = now
+         self.report()
+      self.upload_bytes = 0
+
+   def percentiles(self):
+      """ 50th, 95th and 99th percentile of the frame times in the window (ms) """
+      if not self.frame_times:
+         return 0.0, 0.0, 0.0
+      return tuple(np.percentile(np.array(self.frame_times) * 1000, [50, 95, 99]))
+
+   def report(self):
+      p50, p95, p99 = self.percentiles()
+      print("%s: frame %d  p50 %.2f ms  p95 %.2f ms  p99 %.2f ms  draw calls %d  vertices %d  uploaded %d bytes  "
+            "redundant frames %d" % (self.name, self.frame, p50, p95, p99, self.draw_calls, self.vertices,
+                                     self.upload_bytes, self.redundant))
+
+   def close(self):
+      if self._csv is not None:
+         self._csv.close()
+         self._csv = None
+         self._writer = None
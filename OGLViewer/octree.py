@@ -0,0 +1,133 @@
+""" Octree level of detail for point clouds
+
+Every node stores a random subset of at most `capacity` of the points in its
+cell that are not already stored by one of its ancestors, so drawing a node
+together with all of its ancestors shows its cell at the node's level of detail.
+The points are reordered such that the points of each node are contiguous.
+"""
+import numpy as np
+
+MAX_DEPTH = 10          # deepest level (cells per axis: 2^MAX_DEPTH)
+NODE_CAPACITY = 5000    # points stored per node (except in the deepest level)
+POINT_BUDGET = 1000000  # maximum number of points drawn per frame
+SPLIT_SIZE = 100        # nodes larger than this on screen (pixels) are refined
+
+CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+
+
+def level_offset(depth):
+   """ id of the first node of a level (linear octree numbering) """
+   return (8 ** np.asarray(depth, dtype=np.int64) - 1) // 7
+
+
+def morton_codes(cells, depth):
+   """ interleave the bits of integer (N, 3) cell coordinates """
+   codes = np.zeros(len(cells), dtype=np.int64)
+   for bit in range(depth):
+      for axis in range(3):
+         codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + 2 - axis)
+   return codes
+
+
+class Octree:
+   def __init__(self, data, capacity=NODE_CAPACITY, max_depth=MAX_DEPTH, seed=0):
+      """ build the octree of an (N, 3) point array """
+      data = np.asarray(data, dtype=np.float32)
+      self.max_depth = max_depth
+      self.low = data.min(axis=0).astype(float) if len(data) else np.zeros(3)
+      high = data.max(axis=0).astype(float) if len(data) else np.ones(3)
+      self.size = max(float((high - self.low).max()), 1e-12)
+
+      # integer cell of every point in the deepest level
+      resolution = 2 ** max_depth
+      cells = np.floor((data - self.low) / self.size * resolution).astype(np.int64)
+      cells = np.clip(cells, 0, resolution - 1)
+      codes = morton_codes(cells, max_depth)
+
+      # visit points in random order, so every node gets a uniform subset
+      remaining = np.random.default_rng(seed).permutation(len(data))
+      depth = np.full(len(data), max_depth, dtype=np.int64)
+      for level in range(max_depth):
+         if not remaining.size:
+            break
+         keys = codes[remaining] >> (3 * (max_depth - level))
+         by_key = np.argsort(keys, kind='stable')
+         remaining, keys = remaining[by_key], keys[by_key]
+         first = np.searchsorted(keys, keys)  # first position of every node
+         take = np.arange(len(keys)) - first < capacity
+         depth[remaining[take]] = level
+         remaining = remaining[~take]
+
+      # reorder points node by node
+      ids = level_offset(depth) + (codes >> (3 * (max_depth - depth)))
+      order = np.argsort(ids, kind='stable')
+      self.points = np.ascontiguousarray(data[order])
+      self.ids, self.start, self.count = np.unique(ids[order], return_index=True, return_counts=True)
+      self.depth = depth[order][self.start]
+      self.start = self.start.astype(np.int32)
+      self.count = self.count.astype(np.int32)
+
+      # cube of every node
+      self.node_size = self.size / 2.0 ** self.depth
+      node_cells = cells[order][self.start] >> (max_depth - self.depth)[:, np.newaxis]
+      self.node_low = self.low + node_cells * self.node_size[:, np.newaxis]
+
+   def __len__(self):
+      return len(self.ids)
+
+   def children(self, nodes):
+      """ indices of all existing children of the given nodes """
+      nodes = nodes[self.depth[nodes] < self.max_depth]
+      keys = self.ids[nodes] - level_offset(self.depth[nodes])
+      child_ids = (level_offset(self.depth[nodes] + 1) + 8 * keys)[:, np.newaxis] + np.arange(8)
+      child_ids = child_ids.ravel()
+      found = np.minimum(np.searchsorted(self.ids, child_ids), len(self.ids) - 1)
+      return found[self.ids[found] == child_ids]
+
+   def project(self, nodes, matrix, viewport):
+      """ screen size in pixels and visibility of nodes for a (projection * modelview) matrix """
+      corners = self.node_low[nodes, np.newaxis] + CORNERS * self.node_size[nodes, np.newaxis, np.newaxis]
+      clip = np.concatenate((corners, np.ones(corners.shape[:2] + (1,))), axis=2) @ np.asarray(matrix).T
+      x, y, z, w = clip[..., 0], clip[..., 1], clip[..., 2], clip[..., 3]
+
+      # invisible if all corners are outside of the same frustum plane
+      outside = ((x > w).all(1) | (x < -w).all(1) | (y > w).all(1) | (y < -w).all(1) |
+                 (z > w).all(1) | (z < -w).all(1))
+
+      with np.errstate(divide='ignore', invalid='ignore'):
+         nx, ny = x / w, y / w
+      size = np.maximum(np.ptp(nx, axis=1) * viewport[0], np.ptp(ny, axis=1) * viewport[1]) / 2
+      # nodes reaching behind the camera are always refined
+      size[(w <= 0).any(1)] = np.inf
+      return size, ~outside
+
+   def select(self, matrix, viewport, budget=POINT_BUDGET, split_size=SPLIT_SIZE):
+      """ visible nodes to draw, coarse to fine and largest on screen first, within the point budget
+
+          returns the nodes and the number of points to draw of each node; the first node
+          that does not fit is drawn partially (its points are a random subset, so any
+          prefix is representative), so a budget below the node capacity still shows points """
+      if not len(self):
+         return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+      selected, counts = [], []
+      total = 0
+      nodes = np.array([0])
+      while nodes.size and total < budget:
+         size, visible = self.project(nodes, matrix, viewport)
+         nodes, size = nodes[visible], size[visible]
+         order = np.argsort(-size, kind='stable')
+         nodes, size = nodes[order], size[order]
+
+         fits = total + np.cumsum(self.count[nodes]) <= budget
+         partial = np.flatnonzero(~fits)[:1]
+         selected.append(nodes[fits])
+         counts.append(self.count[nodes[fits]])
+         total += int(counts[-1].sum())
+         if partial.size:
+            selected.append(nodes[partial])
+            counts.append(np.array([budget - total], dtype=np.int32))
+            total = budget
+         nodes, size = nodes[fits], size[fits]
+         nodes = self.children(nodes[size > split_size])
+      counts = np.concatenate(counts)
+      return np.concatenate(selected)[counts > 0], counts[counts > 0]
@@ -6,14 +6,20 @@ import sys
 import os
 import numpy as np
 
+from pointLoader import load_points, iter_chunks, bounding_box as points_bounding_box
+from octree import Octree, POINT_BUDGET
+from quantizedPoints import read_quantized, read_header, iter_quantized_chunks, quantization, QUANTIZED_SUFFIX
+from decimation import decimate
+from spatialIndex import PointGrid
+from frameStats import FrameStats
+
 EXIT = -1
 FIRST = 0
 
-model_data = []
-points = []
+points = np.empty((0, 3), 'f')
 
 bounding_box = ()
-obj_origin = ()
+obj_origin = (0, 0, 0)
 scale = 0
 
 axes = [
@@ -37,11 +43,24 @@ vector_buffer = None
 
 axes_buffer = None
 
-point_buffer = None
+point_buffers = []  # (buffer id, point count) of every uploaded chunk
+point_stream = None  # chunk iterator while a file is streamed
+
+point_octree = None  # level of detail hierarchy (--lod), drawn from the first point buffer
+point_budget = POINT_BUDGET
+
+point_dequantize = None  # (offset, step) if points are 16 bit quantized positions
+
+point_index = None  # spatial index for picking and neighbourhood queries
+picked_index = None  # index of the picked point
+PICK_PIXELS = 5  # pick tolerance around the cursor
+
+stats = FrameStats("oglViewer")  # frame statistics (--stats, --stats-csv=FILE, key p)
+
 
 def init(width, height):
    """ Initialize an OpenGL window """
-   global point_buffer, axes_buffer, vector_buffer, index_buffer
+   global axes_buffer, vector_buffer, index_buffer
    glClearColor(50.0, 50.0, 0.0, 0.0)       #background color
    glMatrixMode(GL_PROJECTION)              #switch to projection matrix
    glLoadIdentity()                         #set to 1
@@ -49,33 +68,58 @@ def init(width, height):
    gluPerspective(45, float(width) / height, 0.1, 100)
    glMatrixMode(GL_MODELVIEW)               #switch to modelview matrix
    glPointSize(2.0)
-   point_buffer = vbo.VBO(np.array(points, 'f'))
+   if len(points):
+      point_buffers.append(upload_points(points))
    axes_buffer = vbo.VBO(np.array(axes, 'f'))
 
    index_buffer = vbo.VBO(np.array(indices, 'uint'))
    vector_buffer = vbo.VBO(np.array(vectors, 'f'))
 
-   # initial translate and scale object to -1, 1 (origin)
-   glScalef(scale, scale, scale)
-   glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
+
+def upload_points(data):
+   """ copy points into a new GPU buffer, returns (buffer id, point count) """
+   data = np.ascontiguousarray(data, np.uint16 if point_dequantize is not None else 'f')
+   buffer = glGenBuffers(1)
+   glBindBuffer(GL_ARRAY_BUFFER, buffer)
+   glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+   stats.upload(data.nbytes)
+   glBindBuffer(GL_ARRAY_BUFFER, 0)
+   return buffer, len(data)
 
 
 def display():
    """ Render all objects"""
    global obj_origin, scale
+   stats.begin_frame()
    glClear(GL_COLOR_BUFFER_BIT) #clear screen
    glColor(0.0, 0.0, 1.0)       #render stuff
 
 
-   # draw points
-   point_buffer.bind()
-   glVertexPointerf(point_buffer)
+   # draw points, translated and scaled to -1, 1 (origin)
+   glPushMatrix()
+   glScalef(scale, scale, scale)
+   glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
    glEnableClientState(GL_VERTEX_ARRAY)
-
-   glDrawArrays(GL_POINTS, 0, len(points))
-
-   point_buffer.unbind()
+   if point_octree is not None:
+      draw_octree()
+   else:
+      vertex_type = GL_FLOAT
+      if point_dequantize is not None:
+         # dequantize on the GPU: offset + position * step
+         glTranslatef(*point_dequantize[0])
+         glScalef(*point_dequantize[1])
+         vertex_type = GL_UNSIGNED_SHORT
+      for buffer, count in point_buffers:
+         glBindBuffer(GL_ARRAY_BUFFER, buffer)
+         glVertexPointer(3, vertex_type, 0, None)
+         glDrawArrays(GL_POINTS, 0, count)
+         stats.draw(count)
+   glBindBuffer(GL_ARRAY_BUFFER, 0)
    glDisableClientState(GL_VERTEX_ARRAY)
+   glPopMatrix()
+
+   if picked_index is not None:
+      draw_picked_point()
 
    # draw coordinate axes
    glPushMatrix()
@@ -84,6 +128,7 @@ def display():
    glVertexPointerf(axes_buffer)
    glEnableClientState(GL_VERTEX_ARRAY)
    glDrawArrays(GL_LINES, 0, len(axes))
+   stats.draw(len(axes))
 
    axes_buffer.unbind()
    glDisableClientState(GL_VERTEX_ARRAY)
@@ -91,10 +136,79 @@ def display():
 
    glutSwapBuffers()
    glFlush()
+   stats.end_frame()
+
+
+def current_matrix():
+   """ projection * modelview matrix of the current OpenGL state """
+   modelview = np.asarray(glGetDoublev(GL_MODELVIEW_MATRIX)).reshape(4, 4).T
+   projection = np.asarray(glGetDoublev(GL_PROJECTION_MATRIX)).reshape(4, 4).T
+   return projection @ modelview
+
+
+def draw_octree():
+   """ draw the octree nodes that are visible and large enough in the current view """
+   viewport = glGetIntegerv(GL_VIEWPORT)
+   nodes, counts = point_octree.select(current_matrix(), viewport[2:], point_budget)
+
+   buffer, count = point_buffers[0]
+   glBindBuffer(GL_ARRAY_BUFFER, buffer)
+   glVertexPointer(3, GL_FLOAT, 0, None)
+   glMultiDrawArrays(GL_POINTS, point_octree.start[nodes], counts, len(nodes))
+   stats.draw(counts.sum())
+
+
+def draw_picked_point():
+   """ highlight the picked point """
+   glPushMatrix()
+   glScalef(scale, scale, scale)
+   glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
+   glPointSize(8.0)
+   glColor(1.0, 0.0, 0.0)
+   glBegin(GL_POINTS)
+   glVertex3f(*point_index.positions(picked_index))
+   glEnd()
+   stats.draw(1)
+   glColor(0.0, 0.0, 1.0)
+   glPointSize(2.0)
+   glPopMatrix()
+
+
+def pick_point(x, y):
+   """ index of the point under the cursor (window coordinates) or None """
+   # object coordinates -> clip coordinates, like in display()
+   normalize = np.diag([scale, scale, scale, 1.0])
+   normalize[:3, 3] = -np.asarray(obj_origin) * scale
+   matrix = current_matrix() @ normalize
+   inverse = np.linalg.inv(matrix)
+
+   viewport = glGetIntegerv(GL_VIEWPORT)
+   ndc_x = 2.0 * (x - viewport[0]) / viewport[2] - 1
+   ndc_y = 1 - 2.0 * (y - viewport[1]) / viewport[3]
+
+   def unproject(nx, ny, nz):
+      p = inverse @ np.array([nx, ny, nz, 1.0])
+      return p[:3] / p[3]
+
+   near, far = unproject(ndc_x, ndc_y, -1), unproject(ndc_x, ndc_y, 1)
+
+   # tolerance of PICK_PIXELS at the depth of the object origin
+   origin = matrix @ np.append(obj_origin, 1.0)
+   depth = origin[2] / origin[3]
+   tolerance = np.linalg.norm(unproject(ndc_x + 2.0 * PICK_PIXELS / viewport[2], ndc_y, depth)
+                              - unproject(ndc_x, ndc_y, depth))
+   return point_index.pick(near, far - near, tolerance)
+
+
+def redraw():
+   """ request a new frame because the scene changed """
+   stats.mark_dirty()
+   glutPostRedisplay()
 
 
 def reshape(width, height):
    """ adjust projection matrix to window size"""
+   stats.mark_dirty()
    glViewport(0, 0, width, height)
    glMatrixMode(GL_PROJECTION)
    glLoadIdentity()
@@ -111,31 +225,44 @@ def reshape(width, height):
 
 def keyPressed(key, x, y):
    """ handle keypress events """
+   global point_budget
    if key == b'q':  # b'q' = Q
       #glDeleteBuffers(1, buffer)
+      stats.close()
       sys.exit()
 
    if key == b'x':
-      glTranslatef(obj_origin[0], obj_origin[1], obj_origin[2])
-      glRotatef(22.5, 1.0, 0, 0)
-      glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
-      display()
+      glRotatef(22.5, 1.0, 0, 0)  # about the object origin, see display()
+      redraw()
    if key == b'y':
-      glTranslatef(obj_origin[0], obj_origin[1], obj_origin[2])
-      glRotatef(22.5, 0, 1.0, 0)
-      glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
-      display()
+      glRotatef(22.5, 0, 1.0, 0)  # about the object origin, see display()
+      redraw()
    if key == b'z':
-      glTranslatef(obj_origin[0], obj_origin[1], obj_origin[2])
-      glRotatef(22.5, 0, 0, 1.0)
-      glTranslatef(-obj_origin[0], -obj_origin[1], -obj_origin[2])
-      display()
+      glRotatef(22.5, 0, 0, 1.0)  # about the object origin, see display()
+      redraw()
+   if key == b'+':
+      point_budget *= 2
+      print("point budget:", point_budget)
+      redraw()
+   if key == b'-':
+      point_budget = max(point_budget // 2, 1000)
+      print("point budget:", point_budget)
+      redraw()
+   if key == b'p':
+      stats.toggle()
 
 
 def mouse(button, state, x, y):
    """ handle mouse events """
+   global picked_index
    if button == GLUT_LEFT_BUTTON and state == GLUT_DOWN:
        print("left mouse button pressed at ", x, y)
+       if point_index is not None:
+           picked_index = pick_point(x, y)
+           if picked_index is not None:
+               print("picked point", picked_index, point_index.positions(picked_index),
+                     "normal", point_index.normal_at(picked_index))
+           redraw()
 
 
 def mouseMotion(x,y):
@@ -147,25 +274,77 @@ def menu_func(value):
    """ handle menue selection """
    print("menue entry ", value, "choosen...")
    if value == EXIT:
+       stats.close()
        sys.exit()
    glutPostRedisplay()
 
 
-def import_data(file):
-   with open(file) as f:
-      for line in f:
-         line = list(map(float, line.strip().split()))
-         model_data.append(line)
-         points.append(np.array([line[0], line[1], line[2], 1]))
+def import_data(file, lod=False, voxel_size=None, poisson_radius=None):
+   global points, point_octree, point_dequantize, point_index, picked_index
+   decimated = voxel_size or poisson_radius
+   point_dequantize = None
+   if file.endswith(QUANTIZED_SUFFIX):
+      # octree and decimation need float positions, otherwise they stay quantized
+      points, _, quantization = read_quantized(file, dequantize_positions=lod or decimated)
+      if not (lod or decimated):
+         point_dequantize = quantization
+   else:
+      points = load_points(file)
+   if decimated:
+      count = len(points)
+      points = decimate(points, voxel_size, poisson_radius)
+      print("decimated", count, "to", len(points), "points")
+   if lod:
+      # the octree reorders the points node by node
+      point_octree = Octree(points)
+      points = point_octree.points
+   # quantized points are indexed as they are, without a float copy
+   point_index = PointGrid(points, quantization=point_dequantize)
+   picked_index = None
    compute_bounding_box()
    compute_scale()
-   print("test")
 
 
-def compute_bounding_box():
+def stream_data(file):
+   """ start streaming a file, its chunks are read and uploaded while the window is idle """
+   global point_stream, bounding_box, point_dequantize
+   bounding_box = ()
+   if file.endswith(QUANTIZED_SUFFIX):
+      # chunks stay quantized, the header gives their dequantization before the first upload
+      with open(file, 'rb') as f:
+         header = read_header(f)
+      point_dequantize = quantization(header['low'], header['high'])
+      point_stream = (positions for positions, _ in iter_quantized_chunks(file))
+   else:
+      point_dequantize = None
+      point_stream = iter_chunks(file)
+   glutIdleFunc(stream_next_chunk)
+
+
+def stream_next_chunk():
+   """ idle callback: read the next chunk of the streamed file and show it """
+   global point_stream
+   chunk = next(point_stream, None)
+   if chunk is None:
+      point_stream = None
+      glutIdleFunc(None)
+      return
+   compute_bounding_box(chunk)
+   compute_scale()
+   point_buffers.append(upload_points(chunk))
+   redraw()
+
+
+def compute_bounding_box(chunk=None):
+   """ compute bounding box and origin of all points, or grow them by a chunk of new points """
    global bounding_box, obj_origin
-   temp = [list(map(min, zip(*model_data))), list(map(max, zip(*model_data)))]
-   bounding_box = (np.array([temp[0][0], temp[0][1], temp[0][2]]), np.array([temp[1][0], temp[1][1], temp[1][2]]))
+   low, high = points_bounding_box(points if chunk is None else chunk)
+   if point_dequantize is not None:
+      offset, step = point_dequantize
+      low, high = offset + low * step, offset + high * step
+   if chunk is not None and bounding_box:
+      low, high = np.minimum(low, bounding_box[0]), np.maximum(high, bounding_box[1])
+   bounding_box = (low, high)
 
    min_array = bounding_box[0]
    max_array = bounding_box[1]
@@ -188,6 +367,7 @@ def compute_scale():
 
 
 def main():
+   global stats
    # Hack for Mac OS X
    cwd = os.getcwd()
    glutInit(sys.argv)
@@ -211,9 +391,24 @@ def main():
    glutAddMenuEntry("EXIT", EXIT)         #Add another menu entry
    glutAttachMenu(GLUT_RIGHT_BUTTON)     #Attach mouse button to menue
 
-   import_data("cow_points.raw")
-
-   init(500,500) #initialize OpenGL state
+   # usage: oglViewer.py [file] [--stream | [--lod] [--voxel=SIZE] [--poisson=RADIUS]]
+   #                     [--stats] [--stats-csv=FILE]
+   # frameStats.py is also used by bspline/bsplineViewer.py, which imports it from this directory
+   args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+   file = args[0] if args else "cow_points.raw"
+   options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+   voxel_size = float(options.get("voxel", 0))
+   poisson_radius = float(options.get("poisson", 0))
+   stats.enabled = "--stats" in sys.argv
+   if "stats-csv" in options:
+      stats = FrameStats("oglViewer", stats.enabled, options["stats-csv"])
+
+   if "--stream" in sys.argv:
+      init(500, 500)
+      stream_data(file) #show points while they are read
+   else:
+      import_data(file, "--lod" in sys.argv, voxel_size, poisson_radius)
+      init(500,500) #initialize OpenGL state
 
    glutMainLoop() #start even processing
 
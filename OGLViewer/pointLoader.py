@@ -0,0 +1,84 @@
+""" Loading of point clouds (.raw text files: one "x y z ..." line per point) """
+import itertools
+import os
+import numpy as np
+
+CACHE_SUFFIX = ".npy"
+
+CHUNK_SIZE = 100000  # points per chunk when streaming
+
+
+def cache_file(file):
+   """ name of the binary sidecar cache of a point file """
+   return file + CACHE_SUFFIX
+
+
+def parse_points(file, columns=(0, 1, 2)):
+   """ parse a point file (or an iterable of its lines) in one pass into a contiguous float32 (N, 3) array,
+       columns=None keeps all columns (coordinates followed by attributes) """
+   data = np.loadtxt(file, dtype=np.float32, usecols=columns, ndmin=2)
+   return np.ascontiguousarray(data)
+
+
+def has_valid_cache(file):
+   """ check if the sidecar cache exists and is not older than the point file """
+   cache = cache_file(file)
+   return os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(file)
+
+
+def load_points(file, use_cache=True):
+   """ load the points of a file, using (and creating) a memory mapped .npy sidecar cache """
+   if not use_cache:
+      return parse_points(file)
+
+   cache = cache_file(file)
+   if has_valid_cache(file):
+      return np.load(cache, mmap_mode='r')
+
+   data = parse_points(file)
+   try:
+      tmp = "%s.%d.tmp" % (cache, os.getpid())
+      with open(tmp, 'wb') as f:
+         np.save(f, data)
+      os.replace(tmp, cache)
+   except OSError as e:
+      print("could not write point cache", cache, e)
+   return data
+
+
+def load_point_file(file, use_cache=True):
+   """ load (N, 3) points of a .raw or quantized point file """
+   # imported here, quantizedPoints itself imports this module
+   from quantizedPoints import read_quantized, QUANTIZED_SUFFIX
+   if file.endswith(QUANTIZED_SUFFIX):
+      return read_quantized(file)[0]
+   return load_points(file, use_cache)
+
+
+def bounding_box(data):
+   """ return the (min, max) corners of an (N, 3) point array """
+   return data.min(axis=0).astype(float), data.max(axis=0).astype(float)
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE, columns=(0, 1, 2)):
+   """ read the points of a file in float32 (n, 3) chunks of at most chunk_size points,
+       only one chunk is held in memory at a time """
+   if columns == (0, 1, 2) and has_valid_cache(file):
+      data = np.load(cache_file(file), mmap_mode='r')
+      for start in range(0, len(data), chunk_size):
+         yield np.array(data[start:start + chunk_size])
+      return
+
+   with open(file) as f:
+      while True:
+         lines = list(itertools.islice(f, chunk_size))
+         if not lines:
+            return
+         chunk = parse_points(lines, columns)
+         if len(chunk):
+            yield chunk
+
+
+def save_points(file, data):
+   """ write points as a .raw text file """
+   np.savetxt(file, data, fmt="%.9g")
@@ -0,0 +1,146 @@
+""" Offscreen CPU rendering of point clouds (no display or GPU needed)
+
+Uses the camera model of the viewer: gluPerspective(45, width / height, 0.1, 100)
+and the object scaled to -1, 1 around its origin (compute_bounding_box / compute_scale).
+The eye is moved back until the bounding sphere of that cube fits into the
+field of view, so the object is not cropped in any rotation (it appears
+smaller than in the viewer).
+
+usage: pointRasterizer.py input [output.png] [--size W H] [--rotate AXIS ...] [--point-size N]
+"""
+import argparse
+import numpy as np
+from PIL import Image
+
+from pointLoader import load_point_file, bounding_box
+
+FOVY = 45
+NEAR = 0.1
+FAR = 100
+# distance of the eye from the object origin: the bounding sphere (radius sqrt(3)) of the -1, 1 cube fills the field of view
+DISTANCE = np.sqrt(3) / np.sin(np.radians(FOVY / 2.0))
+
+BACKGROUND = (255, 255, 0)  # background and point color of the viewer
+COLOR = (0, 0, 255)
+
+AXES = {'x': (1.0, 0, 0), 'y': (0, 1.0, 0), 'z': (0, 0, 1.0)}
+ROTATION_STEP = 22.5  # degrees per x/y/z key press in the viewer
+
+
+def perspective(fovy, aspect, near, far):
+   """ projection matrix of gluPerspective """
+   f = 1.0 / np.tan(np.radians(fovy) / 2)
+   return np.array([[f / aspect, 0, 0, 0],
+                    [0, f, 0, 0],
+                    [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                    [0, 0, -1, 0]])
+
+
+def rotation(angle, axis):
+   """ rotation matrix of glRotatef (angle in degrees) """
+   x, y, z = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+   c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+   matrix = np.eye(4)
+   matrix[:3, :3] = [[x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+                     [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+                     [x * z * (1 - c) - y * s, y * z * (1 - c) + x * s, z * z * (1 - c) + c]]
+   return matrix
+
+
+def key_rotation(keys):
+   """ rotation of a sequence of x/y/z key presses in the viewer """
+   matrix = np.eye(4)
+   for key in keys:
+      matrix = matrix @ rotation(ROTATION_STEP, AXES[key])
+   return matrix
+
+
+def model_matrix(box, rotate=np.eye(4), distance=DISTANCE):
+   """ modelview matrix: scale the bounding box to -1, 1 around its origin, rotate and move it in front of the eye """
+   low, high = np.asarray(box[0], dtype=float), np.asarray(box[1], dtype=float)
+   origin = low + (high - low) / 2
+   extent = np.abs(high - low).max()
+   scale = 2 / extent if extent > 0 else 1.0
+
+   normalize = np.diag([scale, scale, scale, 1.0])
+   normalize[:3, 3] = -origin * scale
+   eye = np.eye(4)
+   eye[2, 3] = -distance
+   return eye @ rotate @ normalize
+
+
+def rasterize(points, matrix, width, height, point_size=1, color=COLOR, background=BACKGROUND, shade=True):
+   """ project all points with a (projection * modelview) matrix and splat them into a z-buffered RGB image """
+   points = np.asarray(points, dtype=np.float32)
+   clip = points @ matrix[:3, :3].T.astype(np.float32) + matrix[:3, 3].astype(np.float32)
+   w = points @ matrix[3, :3].astype(np.float32) + np.float32(matrix[3, 3])
+   visible = (w > 0) & (np.abs(clip) <= w[:, np.newaxis]).all(axis=1)
+   ndc = clip[visible] / w[visible, np.newaxis]
+
+   column = ((ndc[:, 0] + 1) / 2 * width).astype(np.int64)
+   row = ((1 - ndc[:, 1]) / 2 * height).astype(np.int64)
+   depth = ndc[:, 2]
+
+   # square splats of point_size pixels
+   if point_size > 1:
+      offsets = np.arange(point_size) - (point_size - 1) // 2
+      dy, dx = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing='ij')]
+      column = (column[:, np.newaxis] + dx).ravel()
+      row = (row[:, np.newaxis] + dy).ravel()
+      depth = np.repeat(depth, len(dx))
+   inside = (column >= 0) & (column < width) & (row >= 0) & (row < height)
+   pixel, depth = (row * width + column)[inside], depth[inside]
+
+   # z-buffer: nearest point of every pixel
+   order = np.lexsort((depth, pixel))
+   pixel, depth = pixel[order], depth[order]
+   nearest = np.ones(len(pixel), dtype=bool)
+   nearest[1:] = pixel[1:] != pixel[:-1]
+   pixel, depth = pixel[nearest], depth[nearest]
+
+   image = np.empty((height * width, 3), dtype=np.uint8)
+   image[:] = background
+   intensity = np.ones(len(depth))
+   if shade and len(depth):
+      # far points fade towards the background
+      near, far = depth.min(), depth.max()
+      if far > near:
+         intensity -= 0.7 * (depth - near) / (far - near)
+   intensity = intensity[:, np.newaxis]
+   image[pixel] = np.asarray(color) * intensity + np.asarray(background) * (1 - intensity)
+   return image.reshape(height, width, 3)
+
+
+def render(points, width=500, height=500, rotate=np.eye(4), point_size=1, **kwargs):
+   """ render points like the viewer (optionally rotated, see key_rotation) into an RGB array """
+   aspect = width / float(height)
+   distance = DISTANCE
+   if aspect < 1:
+      # the horizontal field of view is the narrower one
+      distance = np.sqrt(3) / np.sin(np.arctan(np.tan(np.radians(FOVY / 2.0)) * aspect))
+   matrix = perspective(FOVY, aspect, NEAR, FAR) @ model_matrix(bounding_box(points), rotate, distance)
+   return rasterize(points, matrix, width, height, point_size, **kwargs)
+
+
+def write_png(image, file):
+   Image.fromarray(image).save(file, format="PNG")
+
+
+def main():
+   parser = argparse.ArgumentParser(description="render a point file into a PNG image without display")
+   parser.add_argument("input")
+   parser.add_argument("output", nargs="?")
+   parser.add_argument("--size", type=int, nargs=2, default=(500, 500), metavar=("W", "H"))
+   parser.add_argument("--rotate", nargs="*", default=[], choices=sorted(AXES),
+                       help="x/y/z key presses of the viewer (22.5 degrees each)")
+   parser.add_argument("--point-size", type=int, default=2)
+   args = parser.parse_args()
+
+   image = render(load_point_file(args.input), args.size[0], args.size[1], key_rotation(args.rotate), args.point_size)
+   output = args.output or args.input.rsplit(".", 1)[0] + ".png"
+   write_png(image, output)
+   print("wrote", output)
+
+
+if __name__ == "__main__":
+   main()
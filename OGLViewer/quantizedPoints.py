@@ -0,0 +1,138 @@
+""" Compact storage of point clouds with 16 bit quantized positions
+
+File layout (little endian):
+   header:  magic "QPTS", version, number of attributes A, number of points,
+            bounding box (min and max corner, float64)
+   chunks:  number of points n, n * 3 uint16 positions, n * A float16 attributes
+
+A position q is dequantized as  min + q * (max - min) / 65535.
+
+usage: quantizedPoints.py input.raw [output.qpc] [--attributes] [--chunk-size N]
+"""
+import argparse
+import numpy as np
+
+from pointLoader import iter_chunks, CHUNK_SIZE
+
+QUANTIZED_SUFFIX = ".qpc"
+MAGIC = b"QPTS"
+VERSION = 1
+LEVELS = 65535
+
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('attributes', '<u2'), ('count', '<u8'),
+                   ('low', '<f8', 3), ('high', '<f8', 3)])
+CHUNK_HEADER = np.dtype([('count', '<u4')])
+
+
+def quantization(low, high):
+   """ (offset, step) which map quantized positions back into the bounding box """
+   low = np.asarray(low, dtype=float)
+   extent = np.asarray(high, dtype=float) - low
+   return low, np.where(extent > 0, extent, 1.0) / LEVELS
+
+
+def quantize(data, offset, step):
+   """ quantize float (n, 3) positions to uint16 """
+   q = np.rint((np.asarray(data, dtype=float) - offset) / step)
+   return np.clip(q, 0, LEVELS).astype('<u2')
+
+
+def dequantize(positions, offset, step):
+   """ float32 (n, 3) positions of quantized uint16 positions """
+   return (offset + positions * step).astype(np.float32)
+
+
+def write_quantized(file, chunks, low, high, count, attributes=0):
+   """ write chunks of float (n, 3 + attributes) rows, the bounding box and count must be known in advance """
+   offset, step = quantization(low, high)
+   header = np.zeros(1, HEADER)
+   header['magic'], header['version'], header['attributes'], header['count'] = MAGIC, VERSION, attributes, count
+   header['low'], header['high'] = low, high
+
+   with open(file, 'wb') as f:
+      header.tofile(f)
+      for chunk in chunks:
+         np.array([len(chunk)], CHUNK_HEADER).tofile(f)
+         quantize(chunk[:, :3], offset, step).tofile(f)
+         np.asarray(chunk[:, 3:3 + attributes], dtype='<f2').tofile(f)
+
+
+def convert(raw_file, out_file, attributes=False, chunk_size=CHUNK_SIZE):
+   """ convert a .raw text file in two streaming passes (bounding box, then quantization) """
+   columns = None if attributes else (0, 1, 2)
+   low, high = np.full(3, np.inf), np.full(3, -np.inf)
+   count, width = 0, 3
+   for chunk in iter_chunks(raw_file, chunk_size, columns):
+      low = np.minimum(low, chunk[:, :3].min(axis=0))
+      high = np.maximum(high, chunk[:, :3].max(axis=0))
+      count += len(chunk)
+      width = chunk.shape[1]
+   if not count:
+      low, high = np.zeros(3), np.zeros(3)
+
+   write_quantized(out_file, iter_chunks(raw_file, chunk_size, columns), low, high, count, width - 3)
+   return count
+
+
+def read_header(f):
+   """ read and check the header of an open quantized point file """
+   header = np.fromfile(f, HEADER, 1)
+   if len(header) != 1 or header['magic'][0] != MAGIC:
+      raise ValueError("not a quantized point file")
+   if header['version'][0] != VERSION:
+      raise ValueError("unsupported quantized point file version %d" % header['version'][0])
+   return header[0]
+
+
+def iter_quantized_chunks(file):
+   """ yield (uint16 (n, 3) positions, float16 (n, A) attributes) chunk by chunk """
+   with open(file, 'rb') as f:
+      header = read_header(f)
+      attributes = int(header['attributes'])
+      while True:
+         chunk_header = np.fromfile(f, CHUNK_HEADER, 1)
+         if not len(chunk_header):
+            return
+         n = int(chunk_header['count'][0])
+         positions = np.fromfile(f, '<u2', 3 * n).reshape(n, 3)
+         values = np.fromfile(f, '<f2', attributes * n).reshape(n, attributes)
+         yield positions, values
+
+
+def read_quantized(file, dequantize_positions=True):
+   """ read a quantized point file
+
+       returns (positions, attributes, (offset, step)), positions are float32 (N, 3)
+       or, with dequantize_positions=False, uint16 (N, 3) to be dequantized by the caller
+       (e.g. with a translate and scale on the GPU) """
+   with open(file, 'rb') as f:
+      header = read_header(f)
+   offset, step = quantization(header['low'], header['high'])
+   count, attributes = int(header['count']), int(header['attributes'])
+
+   positions = np.empty((count, 3), np.float32 if dequantize_positions else np.uint16)
+   values = np.empty((count, attributes), np.float16)
+   start = 0
+   for chunk_positions, chunk_values in iter_quantized_chunks(file):
+      end = start + len(chunk_positions)
+      positions[start:end] = dequantize(chunk_positions, offset, step) if dequantize_positions else chunk_positions
+      values[start:end] = chunk_values
+      start = end
+   return positions, values, (offset, step)
+
+
+def main():
+   parser = argparse.ArgumentParser(description="convert .raw point files to quantized " + QUANTIZED_SUFFIX + " files")
+   parser.add_argument("input")
+   parser.add_argument("output", nargs="?")
+   parser.add_argument("--attributes", action="store_true", help="keep the columns after x y z as float16 attributes")
+   parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+   args = parser.parse_args()
+
+   output = args.output or args.input.rsplit(".", 1)[0] + QUANTIZED_SUFFIX
+   count = convert(args.input, output, args.attributes, args.chunk_size)
+   print("wrote", count, "points to", output)
+
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,212 @@
+""" Uniform grid index over (N, 3) points for picking and neighbourhood queries
+
+The points are sorted by the key of their grid cell once, so the points of
+every occupied cell are a contiguous range. All query results are indices
+into the original point array. Quantized uint16 positions can be indexed
+as they are, only the points a query looks at are dequantized.
+"""
+import numpy as np
+
+POINTS_PER_CELL = 16  # average number of points per occupied cell when choosing the cell size
+KEY_CHUNK = 1 << 20  # points dequantized at once while building the grid
+
+
+def expand_ranges(starts, counts):
+   """ concatenation of the index ranges start:start+count """
+   total = int(counts.sum())
+   if not total:
+      return np.empty(0, dtype=np.int64)
+   ends = np.cumsum(counts)
+   return np.arange(total) - np.repeat(ends - counts, counts) + np.repeat(starts, counts)
+
+
+def cube_offsets(rings):
+   """ (M, 3) offsets of all cells of a cube with `rings` cells around a center cell """
+   offsets = np.arange(-rings, rings + 1)
+   return np.stack(np.meshgrid(offsets, offsets, offsets, indexing='ij'), -1).reshape(-1, 3)
+
+
+class PointGrid:
+   def __init__(self, points, cell_size=None, quantization=None):
+      """ build the index, the cell size is derived from the point density if not given
+          quantization: (offset, step) of quantized positions (see quantizedPoints) """
+      self.points = np.asarray(points) if quantization is not None else np.asarray(points, dtype=np.float32)
+      self.quantization = quantization
+      if len(self.points):
+         # dequantization is monotonic, the bounding box maps to the bounding box
+         self.low, high = (self.dequantized(self.points.min(axis=0)).astype(float),
+                           self.dequantized(self.points.max(axis=0)).astype(float))
+      else:
+         self.low, high = np.zeros(3), np.ones(3)
+      extent = max(float((high - self.low).max()), 1e-12)
+
+      if cell_size is None:
+         # first guess for a filled volume, then adjust for the observed occupancy
+         # (scans are surfaces, there the occupancy grows with the square of the cell size)
+         cell_size = extent / max(len(self.points) / POINTS_PER_CELL, 1) ** (1 / 3.0)
+         occupied = len(np.unique(self._set_grid(cell_size, high)))
+         cell_size *= np.sqrt(POINTS_PER_CELL / (len(self.points) / max(occupied, 1)))
+
+      keys = self._set_grid(max(float(cell_size), extent / 2 ** 20), high)
+      self.order = np.argsort(keys, kind='stable')
+      keys = keys[self.order]
+      first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+      self.cell_keys = keys[first]
+      self.cell_start = first
+      self.cell_count = np.diff(np.r_[first, len(keys)])
+
+   def _set_grid(self, cell_size, high):
+      """ set cell size and dimensions of the grid, returns the cell keys of all points """
+      self.cell_size = cell_size
+      self.dims = np.floor((high - self.low) / cell_size).astype(np.int64) + 1
+      if not len(self.points):
+         return np.empty(0, dtype=np.int64)
+      return np.concatenate([self.key(self.cell(self.positions(slice(i, i + KEY_CHUNK))))
+                             for i in range(0, len(self.points), KEY_CHUNK)])
+
+   def dequantized(self, points):
+      """ float positions of stored points """
+      if self.quantization is None:
+         return points
+      offset, step = self.quantization
+      return (offset + points * step).astype(np.float32)
+
+   def positions(self, indices):
+      """ float positions of the indexed points """
+      return self.dequantized(self.points[indices])
+
+   def cell(self, points):
+      """ integer grid cell of points """
+      return np.floor((np.asarray(points, dtype=float) - self.low) / self.cell_size).astype(np.int64)
+
+   def key(self, cells):
+      """ linear key of cells, -1 for cells outside of the grid """
+      cells = np.asarray(cells)
+      inside = ((cells >= 0) & (cells < self.dims)).all(axis=-1)
+      keys = (cells[..., 0] * self.dims[1] + cells[..., 1]) * self.dims[2] + cells[..., 2]
+      return np.where(inside, keys, -1)
+
+   def points_in_cells(self, keys):
+      """ indices of all points in the given cells """
+      keys = np.unique(keys[keys >= 0])
+      found = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+      found = found[self.cell_keys[found] == keys]
+      return self.order[expand_ranges(self.cell_start[found], self.cell_count[found])]
+
+   def block_range(self, center, rings):
+      """ lowest and highest cell of the cube of cells within `rings` cells around the cell of center,
+          clamped to the grid (empty if low > high on any axis) """
+      cell = self.cell(center)
+      return np.maximum(cell - rings, 0), np.minimum(cell + rings, self.dims - 1)
+
+   def block(self, center, rings):
+      """ keys of the cells of the (clamped) cube of cells within `rings` cells around the cell of center """
+      low, high = self.block_range(center, rings)
+      if (low > high).any():
+         return np.empty(0, dtype=np.int64)
+      if np.prod((high - low + 1).astype(float)) > len(self.cell_keys):
+         # larger than the number of occupied cells: select those instead of enumerating the block
+         cells = np.stack((self.cell_keys // (self.dims[1] * self.dims[2]),
+                           self.cell_keys // self.dims[2] % self.dims[1],
+                           self.cell_keys % self.dims[2]), axis=1)
+         return self.cell_keys[((cells >= low) & (cells <= high)).all(axis=1)]
+      axes = [np.arange(a, b + 1) for a, b in zip(low, high)]
+      return self.key(np.stack(np.meshgrid(*axes, indexing='ij'), -1).reshape(-1, 3))
+
+   def radius(self, center, r):
+      """ indices of all points within distance r of center """
+      if not len(self.cell_keys):
+         return np.empty(0, dtype=np.int64)
+      candidates = self.points_in_cells(self.block(center, int(np.ceil(r / self.cell_size))))
+      distance = np.linalg.norm(self.positions(candidates) - center, axis=1)
+      return candidates[distance <= r]
+
+   def nearest(self, center, k=1):
+      """ indices and distances of the k nearest points, nearest first """
+      k = min(k, len(self.points))
+      if not k:
+         return np.empty(0, dtype=np.int64), np.empty(0)
+      center = np.asarray(center, dtype=float)
+      rings = 1
+      while True:
+         low, high = self.block_range(center, rings)
+         whole_grid = (low <= 0).all() and (high >= self.dims - 1).all()
+         candidates = self.points_in_cells(self.block(center, rings))
+         if len(candidates) >= k:
+            distance = np.linalg.norm(self.positions(candidates) - center, axis=1)
+            nearest = np.argsort(distance)[:k]
+            # all points closer than the k-th candidate are within the searched block
+            if whole_grid or distance[nearest[-1]] <= rings * self.cell_size:
+               return candidates[nearest], distance[nearest]
+         rings *= 2
+
+   def pick(self, origin, direction, tolerance):
+      """ index of the point closest to the ray origin among those within tolerance of the ray, or None """
+      if not len(self.cell_keys):
+         return None
+      origin = np.asarray(origin, dtype=float)
+      direction = np.asarray(direction, dtype=float)
+      direction = direction / np.linalg.norm(direction)
+
+      # cells along the ray inside the bounding box of the points, widened by the tolerance
+      high = self.low + self.dims * self.cell_size
+      with np.errstate(divide='ignore', invalid='ignore'):
+         t0 = (self.low - tolerance - origin) / direction
+         t1 = (high + tolerance - origin) / direction
+      t_near = np.nanmax(np.minimum(t0, t1))
+      t_far = np.nanmin(np.maximum(t0, t1))
+      if t_near > t_far:
+         return None
+      steps = np.arange(t_near, t_far + self.cell_size, self.cell_size / 2)
+      rings = int(np.ceil(tolerance / self.cell_size))
+      cells = self.cell(origin + steps[:, np.newaxis] * direction)
+      candidates = self.points_in_cells(self.key(np.unique(cells, axis=0)[:, np.newaxis] + cube_offsets(rings)).ravel())
+      if not len(candidates):
+         return None
+
+      relative = self.positions(candidates) - origin
+      t = relative @ direction
+      distance = np.linalg.norm(relative - t[:, np.newaxis] * direction, axis=1)
+      hit = (distance <= tolerance) & (t >= 0)
+      if not hit.any():
+         return None
+      return candidates[hit][np.argmin(t[hit])]
+
+   def normals(self, rings=1):
+      """ unit normals of all points, estimated by principal component analysis of the points
+          in the block of cells around the cell of each point (signs are arbitrary) """
+      if not len(self.points):
+         return np.empty((0, 3), dtype=np.float32)
+      # moments of every cell relative to the grid origin (for precision)
+      sorted_points = self.positions(self.order).astype(np.float64) - self.low
+      starts = self.cell_start
+      counts = self.cell_count.astype(float)
+      sums = np.add.reduceat(sorted_points, starts, axis=0)
+      products = np.add.reduceat(sorted_points[:, :, np.newaxis] * sorted_points[:, np.newaxis, :], starts, axis=0)
+
+      # accumulate the moments of the neighbouring cells of every occupied cell
+      cell_coords = self.cell(self.positions(self.order[starts]))
+      n, s, p = np.zeros(len(starts)), np.zeros((len(starts), 3)), np.zeros((len(starts), 3, 3))
+      for offset in cube_offsets(rings):
+         keys = self.key(cell_coords + offset)
+         found = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+         valid = (keys >= 0) & (self.cell_keys[found] == keys)
+         n[valid] += counts[found[valid]]
+         s[valid] += sums[found[valid]]
+         p[valid] += products[found[valid]]
+
+      mean = s / n[:, np.newaxis]
+      covariance = p / n[:, np.newaxis, np.newaxis] - mean[:, :, np.newaxis] * mean[:, np.newaxis, :]
+      # eigenvector of the smallest eigenvalue
+      cell_normals = np.linalg.eigh(covariance)[1][:, :, 0]
+
+      normals = np.empty((len(self.points), 3), dtype=np.float32)
+      normals[self.order] = np.repeat(cell_normals, self.cell_count, axis=0)
+      return normals
+
+   def normal_at(self, index, k=16):
+      """ normal of a single point from its k nearest neighbours """
+      neighbours, _ = self.nearest(self.positions(index), k)
+      local = self.positions(neighbours).astype(np.float64)
+      local -= local.mean(axis=0)
+      return np.linalg.eigh(local.T @ local)[1][:, 0]
@@ -4,16 +4,30 @@ Created on 25.04.2019
 @author: Paul Schade
 """
 
+import os
+import sys
 import numpy as np
 import concurrent.futures as con
 import time
 from PIL import Image
 
+import raytracer_kernels
+from textures import ImageMaterial
+
 WIDTH = 400
 HEIGHT = 400
 
 REFLECTION_DEPTH = 1
 
+# kernel implementation, "numba" (falls back to "numpy" if not installed) or "numpy",
+# the RAYTRACER_BACKEND environment variable takes precedence
+BACKEND = os.environ.get("RAYTRACER_BACKEND", "numba")
+
+# image file for the floor (ImageMaterial), None for the checked floor;
+# the first command line argument takes precedence
+FLOOR_TEXTURE = None
+FLOOR_TILE_SIZE = 4.0  # size of one repetition of the floor image in scene units
+
 PROCESSES = 1
 
 
@@ -62,7 +76,7 @@ class Scene:
 
         intersection_point += (0.00001 * surface_norm_vector)
 
-        material_color = obj.material.color_at(intersection_point)
+        material_color = obj.material.color_at(intersection_point, hit_dist * self.camera.pixel_width)
 
         # Ambient light
         if reflection_depth == 0:
@@ -73,16 +87,16 @@ class Scene:
         # Lambert shading
         for light in self.light_list:
             light = array_from_list(light)
-            vec_point_to_light = normalize_rows(light - intersection_point)
+            vec_point_to_light, shading_intensity = raytracer_kernels.lambert(intersection_point,
+                                                                              surface_norm_vector, light)
             ray_point_to_light = Ray(intersection_point, vec_point_to_light)
 
             if self.check_intersection(ray_point_to_light) is None:
-                shading_intensity = surface_norm_vector.dot(vec_point_to_light)
                 if shading_intensity > 0:
                     color = color + material_color * obj.material.lambert * shading_intensity
 
         # reflective Light (specular)
-        reflected_ray = Ray(intersection_point, normalize_rows(reflection(ray.direction, surface_norm_vector)))
+        reflected_ray = Ray(intersection_point, raytracer_kernels.reflect(ray.direction, surface_norm_vector))
         color = color + self.shoot_ray(reflected_ray, reflection_depth + 1) * obj.material.specular
 
         return color
@@ -165,8 +179,14 @@ class Material(object):
         self.specular = specular
         self.lambert = lambert
 
-    def color_at(self, p):
-        return self.color
+    def color_at(self, p, footprint=0.0):
+        """
+        Returns the color at the given point(s) p
+
+        @param p: a point or an (N, 3) array of points
+        @param footprint: size of the pixel at p (unused by plain materials)
+        """
+        return np.broadcast_to(self.color, np.shape(p))
 
 
 class CheckedMaterial(object):
@@ -185,12 +205,16 @@ class CheckedMaterial(object):
         self.lambert = lambert
         self.check_size = 1
 
-    def color_at(self, p):
-        """Returns the color at the given point p (black or white)"""
-        p * (1.0 / self.check_size)
-        if np.mod((np.abs(p) + 0.5).astype(int).sum(), 2):
-            return self.other_color
-        return self.base_color
+    def color_at(self, p, footprint=0.0):
+        """
+        Returns the color at the given point(s) p (black or white)
+
+        @param p: a point or an (N, 3) array of points
+        @param footprint: size of the pixel at p (unused by checked materials)
+        """
+        p = np.asarray(p) * (1.0 / self.check_size)
+        odd = (np.abs(p) + 0.5).astype(int).sum(axis=-1) % 2
+        return np.where(odd[..., np.newaxis], self.other_color, self.base_color)
 
 
 class Ray(object):
@@ -230,13 +254,8 @@ class Sphere(object):
 
     def intersection_parameter(self, ray):
         """Returns a point of intersection with the sphere if there is one"""
-        co = self.center - ray.origin
-        v = co.dot(ray.direction)
-        discriminant = v * v - co.dot(co) + self.radius * self.radius
-        if discriminant < 0:
-            return None
-        else:
-            return v - np.sqrt(discriminant)
+        hit_dist = raytracer_kernels.sphere_intersection(self.center, self.radius, ray.origin, ray.direction)
+        return None if np.isnan(hit_dist) else hit_dist
 
     def normal_at(self, p):
         """Returns the norm vector of the sphere at a given point on the surface"""
@@ -261,13 +280,8 @@ class Plane(object):
 
     def intersection_parameter(self, ray):
         """Returns a point of intersection with the plane if there is one"""
-        op = ray.origin - self.point
-        a = op.dot(self.normal)
-        b = ray.direction.dot(self.normal)
-        if b:
-            return -a / b
-        else:
-            return None
+        hit_dist = raytracer_kernels.plane_intersection(self.point, self.normal, ray.origin, ray.direction)
+        return None if np.isnan(hit_dist) else hit_dist
 
     def normal_at(self, p):
         """Returns the norm vector of the sphere at a given point on the surface"""
@@ -296,18 +310,8 @@ class Triangle(object):
 
     def intersection_parameter(self, ray):
         """Returns a point of intersection with the triangle if there is one"""
-        w = ray.origin - self.a
-        dv = np.cross(ray.direction, self.v)
-        dvu = dv.dot(self.u)
-        if dvu == 0.0:
-            return None
-        wu = np.cross(w, self.u)
-        r = dv.dot(w) / dvu
-        s = wu.dot(ray.direction) / dvu
-        if 0 <= r <= 1 and 0 <= s <= 1 and r + s <= 1:
-            return wu.dot(self.v) / dvu
-        else:
-            return None
+        hit_dist = raytracer_kernels.triangle_intersection(self.a, self.u, self.v, ray.origin, ray.direction)
+        return None if np.isnan(hit_dist) else hit_dist
 
     def normal_at(self, p):
         """Returns the norm vector of the triangle"""
@@ -323,12 +327,6 @@ def normalize_rows(x: np.ndarray):
     return x / np.linalg.norm(x, ord=None, axis=None, keepdims=True)
 
 
-def reflection(ray, surface_norm_vector):
-    """Returns a vector that describes the direction of a reflected ray"""
-    surface_norm_vector = normalize_rows(surface_norm_vector)
-    return ray - surface_norm_vector.dot(np.dot(2, ray.dot(surface_norm_vector)))
-
-
 def array_from_list(lst):
     """Makes a numpy array out of a list of integers"""
     return np.array([lst[0], lst[1], lst[2]])
@@ -337,6 +335,10 @@ def array_from_list(lst):
 if __name__ == "__main__":
 
     start_time = time.time()
+    print("Kernel backend: " + raytracer_kernels.use_backend(BACKEND))
+
+    floor_texture = sys.argv[1] if len(sys.argv) > 1 else FLOOR_TEXTURE
+    floor_material = ImageMaterial(floor_texture, tile_size=FLOOR_TILE_SIZE) if floor_texture else CheckedMaterial()
 
     # Create object_list
     object_list = [
@@ -344,7 +346,7 @@ if __name__ == "__main__":
         Sphere([-2, 3, -10], 2, Material([0, 255, 0])),
         Sphere([0.5, 7, -10], 2, Material([0, 0, 255])),
         Triangle([3, 3, -10], [-2, 3, -10], [0.5, 7, -10], Material([255, 255, 0])),
-        Plane([0, 0, 0], [0, 1, 0], CheckedMaterial())
+        Plane([0, 0, 0], [0, 1, 0], floor_material)
     ]
 
     # Create light_list
@@ -0,0 +1,206 @@
+"""
+Intersection and shading kernels used by the ray tracers.
+
+Every kernel exists in two implementations with the same signature:
+
+    "numpy"  the plain NumPy expressions (always available)
+    "numba"  fused scalar loops compiled with Numba; they create no temporary
+             arrays and release the GIL, so the threaded ray tracer runs them
+             in parallel
+
+The backend is chosen with use_backend() or the RAYTRACER_BACKEND environment
+variable. If Numba is not installed, "numba" falls back to "numpy".
+Kernels return NaN instead of None if there is no intersection.
+"""
+
+import math
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ("numpy", "numba")
+
+MISS = float("nan")
+
+backend = None
+
+
+def _normalize(x):
+    """Returns x scaled to unit length"""
+    return x / np.linalg.norm(x)
+
+
+# ---------------------------------------------------------------------------
+# NumPy backend
+# ---------------------------------------------------------------------------
+
+def _sphere_intersection_numpy(center, radius, origin, direction):
+    co = center - origin
+    v = co.dot(direction)
+    discriminant = v * v - co.dot(co) + radius * radius
+    if discriminant < 0:
+        return MISS
+    return v - np.sqrt(discriminant)
+
+
+def _plane_intersection_numpy(point, normal, origin, direction):
+    op = origin - point
+    a = op.dot(normal)
+    b = direction.dot(normal)
+    if b:
+        return -a / b
+    return MISS
+
+
+def _triangle_intersection_numpy(a, u, v, origin, direction):
+    w = origin - a
+    dv = np.cross(direction, v)
+    dvu = dv.dot(u)
+    if dvu == 0.0:
+        return MISS
+    wu = np.cross(w, u)
+    r = dv.dot(w) / dvu
+    s = wu.dot(direction) / dvu
+    if 0 <= r <= 1 and 0 <= s <= 1 and r + s <= 1:
+        return wu.dot(v) / dvu
+    return MISS
+
+
+def _lambert_numpy(point, normal, light):
+    to_light = _normalize(light - point)
+    return to_light, normal.dot(to_light)
+
+
+def _reflect_numpy(direction, normal):
+    normal = _normalize(normal)
+    return _normalize(direction - normal * (2 * direction.dot(normal)))
+
+
+# ---------------------------------------------------------------------------
+# fused scalar loops (compiled by Numba)
+# ---------------------------------------------------------------------------
+
+def _sphere_intersection_fused(center, radius, origin, direction):
+    cx = center[0] - origin[0]
+    cy = center[1] - origin[1]
+    cz = center[2] - origin[2]
+    v = cx * direction[0] + cy * direction[1] + cz * direction[2]
+    discriminant = v * v - (cx * cx + cy * cy + cz * cz) + radius * radius
+    if discriminant < 0:
+        return MISS
+    return v - math.sqrt(discriminant)
+
+
+def _plane_intersection_fused(point, normal, origin, direction):
+    a = ((origin[0] - point[0]) * normal[0]
+         + (origin[1] - point[1]) * normal[1]
+         + (origin[2] - point[2]) * normal[2])
+    b = direction[0] * normal[0] + direction[1] * normal[1] + direction[2] * normal[2]
+    if b != 0:
+        return -a / b
+    return MISS
+
+
+def _triangle_intersection_fused(a, u, v, origin, direction):
+    wx = origin[0] - a[0]
+    wy = origin[1] - a[1]
+    wz = origin[2] - a[2]
+    # dv = direction x v
+    dvx = direction[1] * v[2] - direction[2] * v[1]
+    dvy = direction[2] * v[0] - direction[0] * v[2]
+    dvz = direction[0] * v[1] - direction[1] * v[0]
+    dvu = dvx * u[0] + dvy * u[1] + dvz * u[2]
+    if dvu == 0.0:
+        return MISS
+    # wu = w x u
+    wux = wy * u[2] - wz * u[1]
+    wuy = wz * u[0] - wx * u[2]
+    wuz = wx * u[1] - wy * u[0]
+    r = (dvx * wx + dvy * wy + dvz * wz) / dvu
+    s = (wux * direction[0] + wuy * direction[1] + wuz * direction[2]) / dvu
+    if 0 <= r <= 1 and 0 <= s <= 1 and r + s <= 1:
+        return (wux * v[0] + wuy * v[1] + wuz * v[2]) / dvu
+    return MISS
+
+
+def _lambert_fused(point, normal, light):
+    to_light = np.empty(3)
+    length = 0.0
+    for i in range(3):
+        to_light[i] = light[i] - point[i]
+        length += to_light[i] * to_light[i]
+    length = math.sqrt(length)
+    intensity = 0.0
+    for i in range(3):
+        to_light[i] /= length
+        intensity += normal[i] * to_light[i]
+    return to_light, intensity
+
+
+def _reflect_fused(direction, normal):
+    n_len = math.sqrt(normal[0] * normal[0] + normal[1] * normal[1] + normal[2] * normal[2])
+    d_dot_n = (direction[0] * normal[0] + direction[1] * normal[1] + direction[2] * normal[2]) / n_len
+    reflected = np.empty(3)
+    length = 0.0
+    for i in range(3):
+        reflected[i] = direction[i] - normal[i] / n_len * (2 * d_dot_n)
+        length += reflected[i] * reflected[i]
+    length = math.sqrt(length)
+    for i in range(3):
+        reflected[i] /= length
+    return reflected
+
+
+_IMPLEMENTATIONS = {
+    "numpy": {
+        "sphere_intersection": _sphere_intersection_numpy,
+        "plane_intersection": _plane_intersection_numpy,
+        "triangle_intersection": _triangle_intersection_numpy,
+        "lambert": _lambert_numpy,
+        "reflect": _reflect_numpy,
+    },
+}
+
+if numba is not None:
+    _jit = numba.njit(nogil=True, cache=True)
+    _IMPLEMENTATIONS["numba"] = {
+        "sphere_intersection": _jit(_sphere_intersection_fused),
+        "plane_intersection": _jit(_plane_intersection_fused),
+        "triangle_intersection": _jit(_triangle_intersection_fused),
+        "lambert": _jit(_lambert_fused),
+        "reflect": _jit(_reflect_fused),
+    }
+
+
+def use_backend(name):
+    """
+    Selects the implementation of all kernels
+
+    @param name: "numpy" or "numba"
+    @return: name of the backend that is used (falls back to "numpy"
+             if the requested backend is not available)
+    """
+    global backend, sphere_intersection, plane_intersection, triangle_intersection, lambert, reflect
+
+    if name not in BACKENDS:
+        raise ValueError("unknown backend %r, expected one of %s" % (name, BACKENDS))
+    if name not in _IMPLEMENTATIONS:
+        print("backend %r is not available, using 'numpy'" % name)
+        name = "numpy"
+
+    kernels = _IMPLEMENTATIONS[name]
+    sphere_intersection = kernels["sphere_intersection"]
+    plane_intersection = kernels["plane_intersection"]
+    triangle_intersection = kernels["triangle_intersection"]
+    lambert = kernels["lambert"]
+    reflect = kernels["reflect"]
+    backend = name
+    return backend
+
+
+sphere_intersection = plane_intersection = triangle_intersection = lambert = reflect = None
+use_backend(os.environ.get("RAYTRACER_BACKEND", "numba" if numba is not None else "numpy"))
@@ -0,0 +1,156 @@
+"""
+Image textures for the ray tracers.
+
+Mip-map pyramids are built once per image and stored as .npy files in a cache
+directory. Every process maps these files read-only (np.load with mmap_mode),
+so all workers of a pool share one copy of the texture data through the page
+cache instead of holding a private copy each.
+"""
+
+import hashlib
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+
+
+class TextureCache(object):
+    def __init__(self, directory=None):
+        """
+        Creates a texture cache
+
+        @param directory: where the mip levels are stored (default: RAYTRACER_TEXTURE_CACHE
+                          or a directory in the system temp dir)
+        """
+        if directory is None:
+            directory = os.environ.get("RAYTRACER_TEXTURE_CACHE",
+                                       os.path.join(tempfile.gettempdir(), "raytracer_textures"))
+        self.directory = directory
+        self._mip_maps = {}
+
+    def __getstate__(self):
+        # the mapped levels are reopened by every process instead of being pickled
+        return {"directory": self.directory, "_mip_maps": {}}
+
+    def mip_map(self, path):
+        """
+        Returns the mip-map pyramid of an image
+
+        @param path: image file
+        @return: list of read-only (height, width, 3) uint8 arrays, full resolution first
+        """
+        path = os.path.abspath(path)
+        levels = self._mip_maps.get(path)
+        if levels is None:
+            key = self._key(path)
+            if not os.path.exists(self._level_file(key, 0)):
+                self._build(path, key)
+            levels = []
+            while os.path.exists(self._level_file(key, len(levels))):
+                levels.append(np.load(self._level_file(key, len(levels)), mmap_mode="r"))
+            self._mip_maps[path] = levels
+        return levels
+
+    def _key(self, path):
+        """Cache key, changes whenever the image file changes"""
+        stat = os.stat(path)
+        return hashlib.sha1(("%s:%d:%d" % (path, stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()
+
+    def _level_file(self, key, level):
+        return os.path.join(self.directory, "%s_%d.npy" % (key, level))
+
+    def _build(self, path, key):
+        """Computes all mip levels of an image and writes them to the cache directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        image = np.asarray(Image.open(path).convert("RGB"), dtype=np.float32)
+        levels = [image]
+        while image.shape[0] > 1 or image.shape[1] > 1:
+            image = downsample(image)
+            levels.append(image)
+
+        # write the finest level last, its existence marks a complete pyramid
+        for level in reversed(range(len(levels))):
+            tmp_file = self._level_file(key, level) + ".%d.tmp" % os.getpid()
+            with open(tmp_file, "wb") as f:
+                np.save(f, np.round(levels[level]).astype(np.uint8))
+            os.replace(tmp_file, self._level_file(key, level))
+
+
+def downsample(image):
+    """Halves the resolution of an image by averaging 2x2 texel blocks (odd edges are repeated)"""
+    height, width = image.shape[:2]
+    if height % 2 and height > 1:
+        image = np.concatenate((image, image[-1:]), axis=0)
+    if width % 2 and width > 1:
+        image = np.concatenate((image, image[:, -1:]), axis=1)
+    rows = image if height == 1 else (image[0::2] + image[1::2]) / 2
+    return rows if width == 1 else (rows[:, 0::2] + rows[:, 1::2]) / 2
+
+
+texture_cache = TextureCache()
+
+
+class ImageMaterial(object):
+    def __init__(self, path, ambient=0.5, specular=0, lambert=0.8, tile_size=1.0, axes=(0, 2), cache=None):
+        """
+        Image texture which is repeated along two coordinate axes
+
+        @param path: image file
+        @param ambient: ambient part of the texture
+        @param specular: specular part of the texture (for reflections)
+        @param lambert: lambert shading intensity
+        @param tile_size: size of one repetition of the image in scene units
+        @param axes: coordinate axes used as texture coordinates (x and z for a floor)
+        @param cache: TextureCache holding the mip levels (default: the shared texture_cache)
+        """
+        self.path = path
+        self.ambient = ambient
+        self.specular = specular
+        self.lambert = lambert
+        self.tile_size = tile_size
+        self.axes = axes
+        self.cache = cache if cache is not None else texture_cache
+
+    def __getstate__(self):
+        # workers use their own handle on the shared cache
+        state = self.__dict__.copy()
+        if state["cache"] is texture_cache:
+            state["cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.cache is None:
+            self.cache = texture_cache
+
+    @property
+    def mip_map(self):
+        return self.cache.mip_map(self.path)
+
+    def color_at(self, p, footprint=0.0):
+        """
+        Returns the color at the given point(s) p
+
+        @param p: a point or an (N, 3) array of points
+        @param footprint: size of the pixel at p in scene units (selects the mip level)
+        """
+        p = np.asarray(p, dtype=float)
+        levels = self.mip_map
+        height, width = levels[0].shape[:2]
+
+        u = p[..., self.axes[0]] / self.tile_size
+        v = p[..., self.axes[1]] / self.tile_size
+
+        # one texel of level l covers 2^l texels of the full resolution image
+        texels = np.asarray(footprint, dtype=float) * max(width, height) / self.tile_size
+        level = np.log2(np.maximum(texels, 1.0)).astype(int)
+        level = np.broadcast_to(np.minimum(level, len(levels) - 1), u.shape)
+
+        color = np.empty(p.shape[:-1] + (3,))
+        for lvl in np.unique(level):
+            texture = levels[lvl]
+            mask = level == lvl
+            rows = (np.floor(v[mask] * texture.shape[0]).astype(int)) % texture.shape[0]
+            cols = (np.floor(u[mask] * texture.shape[1]).astype(int)) % texture.shape[1]
+            color[mask] = texture[rows, cols]
+        return color
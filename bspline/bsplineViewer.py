@@ -3,9 +3,29 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 import numpy as np
+import os
+import sys
 
-control_points = []
-bspline_points = []
+from controlPoints import ControlPoints
+from curves import BEZIER_METHODS, basis_matrix, bezier_curve, bspline_curve, clamped_knot_vector, evaluate_basis
+
+# the frame statistics are shared with the point cloud viewer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "OGLViewer"))
+from frameStats import FrameStats
+
+control_points = ControlPoints()
+bspline_points = np.empty((0, 2))
+
+# (number of control points, degree, m, mode) bspline_points were computed for
+curve_state = None
+
+# rows of bspline_points / control_points changed since their last upload to the GPU ((start, stop) or None)
+ALL_ROWS = (0, sys.maxsize)
+curve_changed = ALL_ROWS
+control_changed = ALL_ROWS
+
+# seconds to sleep waiting for events while nothing has to be redrawn
+WAIT_TIMEOUT = 0.5
 
 mode = 1
 
@@ -18,6 +38,42 @@ curve_points = 2
 
 degree = 3
 
+# evaluation of Bezier curves in de Casteljau mode (key B cycles through curves.BEZIER_METHODS)
+bezier_method = "bernstein"
+
+# adaptive tessellation (key A): intervals are halved until the curve deviates at most
+# flatness_tolerance pixels from the chord (keys T / shift T, --tolerance=PIXELS)
+adaptive = False
+flatness_tolerance = 0.5
+
+# frame statistics (--stats, --stats-csv=FILE, key P)
+stats = FrameStats("bsplineViewer")
+
+
+class VertexBuffer:
+    """ GPU buffer of 2D vertices which is kept between frames, only changed rows are uploaded """
+    def __init__(self):
+        self.buffer = glGenBuffers(1)
+        self.count = 0
+
+    def update(self, vertices, rows):
+        """ upload the rows (start, stop) of vertices, all of them if their number changed; returns the bytes uploaded """
+        start, stop = rows
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        if len(vertices) != self.count or (start == 0 and stop >= len(vertices)):
+            data = np.array(vertices, dtype=np.float32).reshape(-1, 2)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data if len(data) else None, GL_DYNAMIC_DRAW)
+        else:
+            data = np.array(vertices[start:stop], dtype=np.float32).reshape(-1, 2)
+            glBufferSubData(GL_ARRAY_BUFFER, start * 2 * data.itemsize, data.nbytes, data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.count = len(vertices)
+        return data.nbytes
+
+    def bind(self):
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glVertexPointer(2, GL_FLOAT, 0, None)
+
 
 class GLFWWindow:
     def __init__(self):
@@ -53,6 +109,10 @@ class GLFWWindow:
         glfw.set_mouse_button_callback(self.window, self.on_mouse_button)
         glfw.set_cursor_pos_callback(self.window, self.mouse_moved)
         glfw.set_key_callback(self.window, self.on_keyboard)
+        glfw.set_window_refresh_callback(self.window, lambda win: self.redraw())
+
+        # the window is only redrawn if something changed
+        self.dirty = True
 
         # exit flag
         self.exitNow = False
@@ -81,10 +141,19 @@ class GLFWWindow:
         # set point size
         glPointSize(10)
 
+        # vertex buffers of the curve and the control points
+        self.curve_buffer = VertexBuffer()
+        self.control_buffer = VertexBuffer()
+
         print_status()
 
+    def redraw(self):
+        self.dirty = True
+        stats.mark_dirty()
+
     def on_mouse_button(self, win, button, action, mods):
         global n, m, mode
+        self.redraw()
         if button == glfw.MOUSE_BUTTON_LEFT:
             if action == glfw.PRESS:
                 x, y = glfw.get_cursor_pos(win)
@@ -92,15 +161,13 @@ class GLFWWindow:
                     control_points.append([x, y])
                     n += 10
                     m += 10
+                    draw_curve(mode)
 
                 else:
-                    self.control_index = None
-                    for p in control_points:
-                        if (p[0] - 10) < x < (p[0] + 10) and (p[1] - 10) < y < (p[1] + 10):
-                            self.control_index = control_points.index([p[0], p[1]])
-                            self.do_translation = True
-
-                    if self.control_index is None:
+                    self.control_index = control_points.hit(x, y)
+                    if self.control_index is not None:
+                        self.do_translation = True
+                    else:
                         control_points.append([x, y])
                         n += 10
                         m += 10
@@ -114,21 +181,25 @@ class GLFWWindow:
             if action == glfw.PRESS:
                 if self.control_index is not None:
                     control_points.pop(self.control_index)
+                    self.control_index = None
                     draw_curve(mode)
 
     def mouse_moved(self, win, x, y):
+        self.mouse_pos = [x, y]
         if self.do_translation:
+            # the dragged point keeps its index, even when it passes other points
             control_points[self.control_index] = [x, y]
-            draw_curve(mode)
+            update_curve_point(self.control_index)
+            self.redraw()
+            return
 
-        self.mouse_pos = [x, y]
-        self.control_index = None
-        for p in control_points:
-            if (p[0] - 10) < x < (p[0] + 10) and (p[1] - 10) < y < (p[1] + 10):
-                self.control_index = control_points.index([p[0], p[1]])
+        previous_index = self.control_index
+        self.control_index = control_points.hit(x, y)
+        if self.control_index != previous_index:
+            self.redraw()
 
     def on_keyboard(self, win, key, scancode, action, mods):
-        global m, n, degree, mode
+        global m, n, degree, mode, bezier_method, adaptive, flatness_tolerance
 
         if key == glfw.KEY_LEFT_SHIFT:
             if action == glfw.PRESS:
@@ -137,13 +208,15 @@ class GLFWWindow:
                 self.left_shift_pressed = False
 
         if action == glfw.PRESS or action == glfw.REPEAT:
+            self.redraw()
+
             if key == glfw.KEY_ESCAPE:
                 self.exitNow = True
 
             if key == glfw.KEY_C:
                 n = DEFAULT_N
                 control_points.clear()
-                bspline_points.clear()
+                draw_curve(mode)
                 self.show_control_polygon = True
 
             if key == glfw.KEY_H:
@@ -185,130 +258,162 @@ class GLFWWindow:
                 draw_curve(mode)
                 print_mode()
 
+            if key == glfw.KEY_B:
+                bezier_method = BEZIER_METHODS[(BEZIER_METHODS.index(bezier_method) + 1) % len(BEZIER_METHODS)]
+                draw_curve(mode)
+                print_bezier_method()
+
+            if key == glfw.KEY_A:
+                adaptive = not adaptive
+                draw_curve(mode)
+                print_amount_points()
+
+            if key == glfw.KEY_T:
+                if self.left_shift_pressed:
+                    flatness_tolerance *= 2
+                else:
+                    flatness_tolerance /= 2
+                draw_curve(mode)
+                print_amount_points()
+
             if key == glfw.KEY_S:
                 print_status()
 
+            if key == glfw.KEY_P:
+                stats.toggle()
+
+    def upload(self):
+        """ copy changed curve and control points into their vertex buffers """
+        global curve_changed, control_changed
+        if curve_changed is not None:
+            stats.upload(self.curve_buffer.update(bspline_points, curve_changed))
+            curve_changed = None
+        if control_changed is not None:
+            stats.upload(self.control_buffer.update(control_points, control_changed))
+            control_changed = None
+
+    def render(self):
+        stats.begin_frame()
+        self.upload()
+
+        glClear(GL_COLOR_BUFFER_BIT)
+        glLineWidth(1)
+        glEnableClientState(GL_VERTEX_ARRAY)
+
+        # draw spline
+        self.curve_buffer.bind()
+        glLineWidth(4)
+        #glDrawArrays(GL_POINTS, 0, self.curve_buffer.count)
+        glDrawArrays(GL_LINE_STRIP, 0, self.curve_buffer.count)
+        stats.draw(self.curve_buffer.count)
+
+        # draw points
+        glColor3f(0, 0, 1)
+        self.control_buffer.bind()
+        control_count = self.control_buffer.count
+        if self.show_control_polygon:
+            if control_count >= 2:
+                # draw control polygon
+                glLineWidth(1)
+                glDrawArrays(GL_LINE_STRIP, 0, control_count)
+                stats.draw(control_count)
+
+            # draw regular control points
+            glDrawArrays(GL_POINTS, 0, control_count)
+            stats.draw(control_count)
+
+            # draw
+            if self.control_index is not None:
+                # draw mouse control point
+                glColor3f(1, 0.5, 0)
+                glPointSize(20)
+                glDrawArrays(GL_POINTS, self.control_index, 1)
+                stats.draw(1)
+                glColor3f(0, 0, 1)
+                glPointSize(10)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glfw.swap_buffers(self.window)
+        stats.end_frame()
+
     def run(self):
         # initializer timer
         glfw.set_time(0.0)
-        t = 0.0
+        t = -1.0
         while not glfw.window_should_close(self.window) and not self.exitNow:
-            # update every x seconds
+            # redraw at most frame_rate times per second and only if something changed
             curr_t = glfw.get_time()
-            if curr_t - t > 1.0 / self.frame_rate:
+            if self.dirty and curr_t - t >= 1.0 / self.frame_rate:
                 # update time
                 t = curr_t
-
-                glClear(GL_COLOR_BUFFER_BIT)
-                glLineWidth(1)
-                glEnableClientState(GL_VERTEX_ARRAY)
-
-                # draw spline
-                glVertexPointerf(bspline_points)
-                glLineWidth(4)
-                #glDrawArrays(GL_POINTS, 0, len(bspline_points))
-                glDrawArrays(GL_LINE_STRIP, 0, len(bspline_points))
-
-                # draw points
-                glColor3f(0, 0, 1)
-                glVertexPointerf(control_points)
-                if self.show_control_polygon:
-                    if len(control_points) >= 2:
-                        # draw control polygon
-                        glLineWidth(1)
-                        glDrawArrays(GL_LINE_STRIP, 0, len(control_points))
-
-                    # draw regular control points
-                    glDrawArrays(GL_POINTS, 0, len(control_points))
-
-                    # draw
-                    if self.control_index is not None:
-                        # draw mouse control point
-                        glColor3f(1, 0.5, 0)
-                        glPointSize(20)
-                        glDrawArrays(GL_POINTS, self.control_index, 1)
-                        glColor3f(0, 0, 1)
-                        glPointSize(10)
-
-                glDisableClientState(GL_VERTEX_ARRAY)
-                glfw.swap_buffers(self.window)
-
-                # Poll for and process events
-                glfw.poll_events()
+                self.dirty = False
+                self.render()
+
+            # sleep until events arrive (or the next frame is due)
+            if self.dirty:
+                glfw.wait_events_timeout(max(t + 1.0 / self.frame_rate - glfw.get_time(), 0.001))
+            else:
+                glfw.wait_events_timeout(WAIT_TIMEOUT)
         # end
+        stats.close()
         glfw.terminate()
 
 
 def draw_curve(mode):
     """ draw bezier curve defined by (control-)points """
-    global bspline_points, degree, m
+    global bspline_points, curve_state, curve_changed, control_changed
 
-    bezier_point_list = []
+    cps = np.array(control_points, dtype=float).reshape(-1, 2)
+    tolerance = flatness_tolerance if adaptive else None
     if mode:
-        knotvector = calc_knot_vector()
-        if knotvector:
-            for i in range(m+1):
-                t = max(knotvector) * (i / m)
-                r = None
-
-                # calc parameter r
-                for j in range(len(knotvector)):
-                    if t == max(knotvector):
-                        r = len(knotvector) - degree - 1
-                        break
-                    if knotvector[j] <= t < knotvector[j + 1]:
-                        r = j
-                        break
-
-                boor_point = deboor(degree, np.array(control_points), knotvector, t, degree-1, r)
-                bezier_point_list.append(boor_point)
-
+        bspline_points = bspline_curve(cps, degree, m, tolerance)
     else:
-        if len(control_points) > 1:
-            for i in range(0, n + 1):
-                t = i / n
-                bezier_point_list.append(casteljau(np.array(control_points), t))
+        bspline_points = bezier_curve(cps, n, bezier_method, tolerance)
+    curve_state = (len(control_points), degree, m, mode)
+    curve_changed = ALL_ROWS
+    control_changed = ALL_ROWS
 
-    bspline_points = [list(x) for x in bezier_point_list]
 
+def update_curve_point(index):
+    """ update the curve after control point index moved
 
-def deboor(degree, controlpoints, knot_vector, t, j, i):
-    if j == 0:
-        return controlpoints[i]
+        A B-spline control point only influences the samples whose knot span is
+        within degree spans of it, so only those are evaluated and patched in place.
+        Bezier curves, adaptive tessellations and changed curve parameters are evaluated completely. """
+    global curve_changed, control_changed
+    if not mode or adaptive or curve_state != (len(control_points), degree, m, mode) or not calc_knot_vector():
+        draw_curve(mode)
+        return
 
-    if knot_vector[i - j + degree] - knot_vector[i] == 0:
-        alpha = 0
-    else:
-        alpha = (t - knot_vector[i]) / (knot_vector[i - j + degree] - knot_vector[i])
-
-    return (1 - alpha) * deboor(degree, controlpoints, knot_vector, t, j-1, i-1) \
-        + alpha * deboor(degree, controlpoints, knot_vector, t, j-1, i)
+    columns, weights = basis_matrix(len(control_points), degree, m)
+    first_column = columns[:, 0]
+    rows = slice(np.searchsorted(first_column, index - degree + 1),
+                 np.searchsorted(first_column, index, side='right'))
 
+    # the affected samples only use the control points index - degree + 1 ... index + degree - 1
+    low = max(index - degree + 1, 0)
+    local_points = np.array(control_points[low:index + degree])
+    bspline_points[rows] = evaluate_basis(columns[rows] - low, weights[rows], local_points)
+    curve_changed = merge_rows(curve_changed, rows.start, rows.stop)
+    control_changed = merge_rows(control_changed, index, index + 1)
 
-def casteljau(bezier_points, t):
-    if len(bezier_points) == 1:
-        return bezier_points[0]
-    new_point_list = []
-    for i in range(len(bezier_points) - 1):
-        new_point_list.append((1 - t) * bezier_points[i] + t * bezier_points[i + 1])
 
-    return casteljau(new_point_list, t)
+def merge_rows(changed, start, stop):
+    """ smallest row range (start, stop) containing the changed rows and start ... stop - 1 """
+    if changed is None:
+        return start, stop
+    return min(changed[0], start), max(changed[1], stop)
 
 
 def calc_knot_vector():
-    points_len = len(control_points) - 1
-    if points_len < degree:
-        return None
-
-    start = [0 for x in range(degree)]
-    middle = [x for x in range(1, points_len - (degree - 2))]
-    end = [points_len - (degree - 2) for x in range(degree)]
-    return start + middle + end
+    return clamped_knot_vector(len(control_points), degree)
 
 
 def print_status():
     print("\n------Status-------")
     print_mode()
+    print_bezier_method()
     print_degree()
     print_amount_points()
 
@@ -320,17 +425,32 @@ def print_mode():
         print("mode: de_Casteljau")
 
 
+def print_bezier_method():
+    print("Bezier evaluation:", bezier_method)
+
+
 def print_degree():
     print("Degree:", degree-1)
 
 
 def print_amount_points():
-    if mode:
+    if adaptive:
+        print("Curve points: %d (adaptive, tolerance %g pixels)" % (len(bspline_points), flatness_tolerance))
+    elif mode:
         print("Curve points:", m)
     else:
         print("Curve points:", n)
 
 
 if __name__ == '__main__':
+    # usage: bsplineViewer.py [--stats] [--stats-csv=FILE] [--tolerance=PIXELS]
+    # needs the OGLViewer directory next to this one, frameStats is imported from there
+    for arg in sys.argv[1:]:
+        if arg.startswith("--stats-csv="):
+            stats = FrameStats("bsplineViewer", csv_file=arg.split("=", 1)[1])
+        if arg.startswith("--tolerance="):
+            adaptive = True
+            flatness_tolerance = float(arg.split("=", 1)[1])
+    stats.enabled = "--stats" in sys.argv
     render_win = GLFWWindow()
     render_win.run()
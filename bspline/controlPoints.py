@@ -0,0 +1,107 @@
+""" Control points of a curve with a uniform grid hash for hit tests
+
+ControlPoints behaves like the list of [x, y] control points the viewer used
+before (append, pop, clear, item assignment, len, iteration, slicing, np.array)
+but keeps the points in a growable (N, 2) array and the index of every point in
+the grid cell containing it. A hit test only looks at the cells overlapping the
+hit box, so it does not depend on the number of points.
+"""
+import math
+import numpy as np
+
+HIT_SIZE = 10  # half edge length of the square hit box around a point (pixels)
+CELL_SIZE = 2 * HIT_SIZE  # a hit box overlaps at most 2 x 2 cells
+
+
+class ControlPoints:
+    def __init__(self, points=(), cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self._points = np.empty((16, 2))
+        self._count = 0
+        self.cells = {}  # (column, row) -> set of point indices
+        for p in points:
+            self.append(p)
+
+    @property
+    def points(self):
+        """ (N, 2) array of the points (a view, valid until the next append) """
+        return self._points[:self._count]
+
+    def cell(self, p):
+        return math.floor(p[0] / self.cell_size), math.floor(p[1] / self.cell_size)
+
+    def _add_to_cell(self, index):
+        self.cells.setdefault(self.cell(self._points[index]), set()).add(index)
+
+    def _remove_from_cell(self, index):
+        cell = self.cell(self._points[index])
+        indices = self.cells[cell]
+        indices.discard(index)
+        if not indices:
+            del self.cells[cell]
+
+    def _index(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("control point index out of range")
+        return index
+
+    def append(self, p):
+        if self._count == len(self._points):
+            self._points = np.concatenate((self._points, np.empty_like(self._points)))
+        self._points[self._count] = p
+        self._count += 1
+        self._add_to_cell(self._count - 1)
+
+    def pop(self, index=-1):
+        """ remove and return a point, the following points move down by one index """
+        index = self._index(index)
+        p = self._points[index].tolist()
+        for i in range(index, self._count):
+            self._remove_from_cell(i)
+        self._points[index:self._count - 1] = self._points[index + 1:self._count]
+        self._count -= 1
+        for i in range(index, self._count):
+            self._add_to_cell(i)
+        return p
+
+    def clear(self):
+        self._count = 0
+        self.cells.clear()
+
+    def __setitem__(self, index, p):
+        """ move a point """
+        index = self._index(index)
+        if self.cell(p) != self.cell(self._points[index]):
+            self._remove_from_cell(index)
+            self._points[index] = p
+            self._add_to_cell(index)
+        else:
+            self._points[index] = p
+
+    def __getitem__(self, key):
+        return self.points[key]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.points, dtype=dtype)
+
+    def hit(self, x, y, size=HIT_SIZE):
+        """ index of the point whose hit box (edge 2 * size) contains (x, y), or None;
+            the last (topmost drawn) point wins if several boxes overlap """
+        low_column, low_row = self.cell((x - size, y - size))
+        high_column, high_row = self.cell((x + size, y + size))
+        found = None
+        for column in range(low_column, high_column + 1):
+            for row in range(low_row, high_row + 1):
+                for index in self.cells.get((column, row), ()):
+                    px, py = self._points[index]
+                    if abs(px - x) < size and abs(py - y) < size and (found is None or index > found):
+                        found = index
+        return found
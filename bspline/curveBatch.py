@@ -0,0 +1,101 @@
+""" Batch evaluation of many curves without a window
+
+Input: text file with one curve per line, the control points as "x0 y0 x1 y1 ...",
+empty lines and lines starting with # are skipped.
+Output: .npz file with the float32 curve points of all curves one after another
+("points", shape (total, 2)) and the start of every curve ("offsets", shape
+(curves + 1,)): curve i is points[offsets[i]:offsets[i + 1]].
+
+usage: curveBatch.py input output.npz [--mode bspline|bezier] [--order K] [--samples M]
+                     [--method bernstein|forward|subdivision] [--tolerance PIXELS]
+                     [--workers N] [--chunk-size N]
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+from curves import BEZIER_METHODS, evaluate_curve
+
+CHUNK_SIZE = 256  # curves per task
+
+
+def read_curves(file):
+    """ list of (N, 2) control point arrays, one per curve """
+    curves = []
+    with open(file) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            values = np.array(line.split(), dtype=float)
+            if len(values) % 2:
+                raise ValueError("%s:%d: odd number of coordinates" % (file, line_number))
+            curves.append(values.reshape(-1, 2))
+    return curves
+
+
+def write_samples(file, samples):
+    """ write the point arrays of all curves as flat points plus offsets """
+    counts = [len(s) for s in samples]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    points = np.concatenate(samples).astype(np.float32) if samples else np.empty((0, 2), dtype=np.float32)
+    np.savez(file, points=points.reshape(-1, 2), offsets=offsets)
+
+
+def read_samples(file):
+    """ list of the point arrays of all curves of a file written by write_samples """
+    with np.load(file) as data:
+        points, offsets = data["points"], data["offsets"]
+    return [points[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def evaluate_chunk(task):
+    """ evaluate a list of curves with the same parameters """
+    curves, mode, order, samples, method, tolerance = task
+    return [evaluate_curve(c, mode, order, samples, method, tolerance).reshape(-1, 2).astype(np.float32)
+            for c in curves]
+
+
+def evaluate_file(input, output, mode=1, order=3, samples=50, method="bernstein", tolerance=None,
+                  workers=None, chunk_size=CHUNK_SIZE):
+    """ evaluate all curves of the input file in parallel and write the output file, reports timing """
+    start = time.time()
+    curves = read_curves(input)
+    tasks = [(curves[i:i + chunk_size], mode, order, samples, method, tolerance)
+             for i in range(0, len(curves), chunk_size)]
+
+    results = []
+    # workers keep their cached basis matrices for all chunks they evaluate
+    with mp.Pool(workers) as pool:
+        for chunk in pool.imap(evaluate_chunk, tasks):
+            results.extend(chunk)
+    write_samples(output, results)
+
+    elapsed = time.time() - start
+    total = sum(len(r) for r in results)
+    print("%d curves, %d points" % (len(results), total))
+    print("Time elapsed: %.2f sec (%.0f curves/sec)" % (elapsed, len(results) / elapsed if elapsed > 0 else 0))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="evaluate all curves of a file")
+    parser.add_argument("input")
+    parser.add_argument("output", help=".npz file")
+    parser.add_argument("--mode", default="bspline", choices=("bspline", "bezier"))
+    parser.add_argument("--order", type=int, default=3, help="order of the B-splines (degree + 1)")
+    parser.add_argument("--samples", type=int, default=50, help="uniform samples per curve (+1)")
+    parser.add_argument("--method", default="bernstein", choices=BEZIER_METHODS, help="Bezier evaluation")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="adaptive flattening with this maximum deviation instead of uniform samples")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="curves per task")
+    args = parser.parse_args()
+
+    evaluate_file(args.input, args.output, args.mode == "bspline", args.order, args.samples, args.method,
+                  args.tolerance, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+""" Curve evaluation without any window or OpenGL dependency
+
+B-splines are clamped with uniform inner knots (clamped_knot_vector), Bezier
+curves are defined by all control points. Control points are (N, D) arrays,
+results are arrays of curve points. As in the viewer, degree denotes the order
+of a spline: the number of control points influencing one span (polynomial
+degree + 1).
+
+bspline_curve / bezier_curve / evaluate_curve evaluate whole curves, the other
+functions are the building blocks (basis matrices, de Boor and de Casteljau
+schemes, knot insertion, conversion to Bezier segments, adaptive flattening).
+"""
+import numpy as np
+from functools import lru_cache
+
+# number of cached basis matrices (least recently used ones are dropped)
+BASIS_CACHE_SIZE = 32
+
+# evaluation of Bezier curves:
+#   bernstein   - cached Bernstein matrix times control points
+#   forward     - forward differencing, used up to FORWARD_MAX_DEGREE (loses precision above)
+#   subdivision - de Casteljau scheme for all samples at once, numerically most stable
+BEZIER_METHODS = ("bernstein", "forward", "subdivision")
+FORWARD_MAX_DEGREE = 4
+
+# adaptive flattening: intervals are halved at most MAX_FLATNESS_DEPTH times,
+# the deviation from the chord is measured at FLATNESS_FRACTIONS of every interval
+MAX_FLATNESS_DEPTH = 16
+FLATNESS_FRACTIONS = np.array([0.25, 0.5, 0.75])
+
+
+def clamped_knot_vector(control_points_len, degree):
+    points_len = control_points_len - 1
+    if points_len < degree:
+        return None
+
+    start = [0 for x in range(degree)]
+    middle = [x for x in range(1, points_len - (degree - 2))]
+    end = [points_len - (degree - 2) for x in range(degree)]
+    return start + middle + end
+
+
+def knot_spans(degree, knot_vector, t):
+    """ index r with knot_vector[r] <= t < knot_vector[r + 1] for every parameter t """
+    r = np.searchsorted(knot_vector, t, side='right') - 1
+    r[t >= knot_vector[-1]] = len(knot_vector) - degree - 1
+    return r
+
+
+def deboor_samples(degree, controlpoints, knot_vector, t):
+    """ evaluate the spline at all parameters t at once (triangular de Boor scheme on (len(t), degree, 2) arrays) """
+    knot_vector = np.asarray(knot_vector, dtype=float)
+    t = np.asarray(t, dtype=float)
+
+    # control points r - degree + 1 ... r of every sample
+    indices = knot_spans(degree, knot_vector, t)[:, np.newaxis] - degree + 1 + np.arange(degree)
+    return deboor_scheme(degree, knot_vector, t, indices, controlpoints[indices])
+
+
+def deboor_scheme(degree, knot_vector, t, indices, points):
+    """ reduce the (len(t), degree, ...) points of the control point indices to one point per parameter """
+    for j in range(1, degree):
+        i = indices[:, j:]
+        lower = knot_vector[i]
+        width = knot_vector[i - j + degree] - lower
+        alpha = np.where(width == 0, 0, (t[:, np.newaxis] - lower) / np.where(width == 0, 1, width))
+        alpha = alpha[:, :, np.newaxis]
+        points = (1 - alpha) * points[:, :-1] + alpha * points[:, 1:]
+    return points[:, 0]
+
+
+@lru_cache(maxsize=BASIS_CACHE_SIZE)
+def basis_matrix(points_len, degree, m):
+    """ banded (m+1) x points_len basis matrix of the clamped spline sampled at m+1 parameters:
+        row i has the nonzero entries weights[i] in the columns columns[i] """
+    knot_vector = np.array(clamped_knot_vector(points_len, degree), dtype=float)
+    t = knot_vector[-1] * (np.arange(m + 1) / m)
+
+    # evaluating unit vectors instead of control points gives the basis function values
+    columns = knot_spans(degree, knot_vector, t)[:, np.newaxis] - degree + 1 + np.arange(degree)
+    unit = np.broadcast_to(np.eye(degree), (m + 1, degree, degree))
+    weights = deboor_scheme(degree, knot_vector, t, columns, unit)
+
+    columns.flags.writeable = False
+    weights.flags.writeable = False
+    return columns, weights
+
+
+def evaluate_basis(columns, weights, controlpoints):
+    """ curve points B @ P of a banded basis matrix (see basis_matrix) """
+    return np.einsum('ij,ijk->ik', weights, controlpoints[columns])
+
+
+def insert_knot(degree, knot_vector, controlpoints, u, times=1):
+    """ Boehm knot insertion: knot vector and control points of the same spline with u inserted times times """
+    knot_vector = np.asarray(knot_vector, dtype=float)
+    controlpoints = np.asarray(controlpoints, dtype=float)
+    p = degree - 1
+    for _ in range(times):
+        r = knot_spans(degree, knot_vector, np.array([u], dtype=float))[0]
+        i = np.arange(r - p + 1, r + 1)
+        alpha = ((u - knot_vector[i]) / (knot_vector[i + p] - knot_vector[i]))[:, np.newaxis]
+        controlpoints = np.concatenate((controlpoints[:r - p + 1],
+                                        (1 - alpha) * controlpoints[i - 1] + alpha * controlpoints[i],
+                                        controlpoints[r:]))
+        knot_vector = np.insert(knot_vector, r + 1, u)
+    return knot_vector, controlpoints
+
+
+def refine(degree, knot_vector, controlpoints, knots):
+    """ insert all given knots (knot refinement), the curve stays the same """
+    for u in np.sort(np.asarray(knots, dtype=float)):
+        knot_vector, controlpoints = insert_knot(degree, knot_vector, controlpoints, u)
+    return knot_vector, controlpoints
+
+
+def multiplicity(knot_vector, u):
+    return int(np.count_nonzero(np.asarray(knot_vector) == u))
+
+
+def split_curve(degree, knot_vector, controlpoints, u):
+    """ split a clamped spline at an inner parameter u into two clamped splines ((knots, points), (knots, points)) """
+    knot_vector, controlpoints = insert_knot(degree, knot_vector, controlpoints, u,
+                                             degree - multiplicity(knot_vector, u))
+    first = int(np.searchsorted(knot_vector, u))
+    return ((knot_vector[:first + degree], controlpoints[:first]),
+            (knot_vector[first:], controlpoints[first:]))
+
+
+def bezier_segments(degree, knot_vector, controlpoints):
+    """ convert a clamped spline into Bezier segments of the same degree
+
+        Every inner knot is inserted until its multiplicity is degree - 1; then neighbouring
+        segments share an end point and the control points of segment j are
+        controlpoints[j * (degree - 1) ... (j + 1) * (degree - 1)].
+        Returns the (segments, degree, ...) control points and the segment breakpoints. """
+    p = degree - 1
+    breakpoints = np.unique(np.asarray(knot_vector, dtype=float))
+    for u in breakpoints[1:-1]:
+        knot_vector, controlpoints = insert_knot(degree, knot_vector, controlpoints, u,
+                                                 p - multiplicity(knot_vector, u))
+    controlpoints = np.asarray(controlpoints, dtype=float)
+    segments = np.arange(len(breakpoints) - 1)[:, np.newaxis] * p + np.arange(degree)
+    return controlpoints[segments], breakpoints
+
+
+def evaluate_segments(segments, samples):
+    """ samples+1 points of every Bezier segment (same degree), (segments, samples+1, ...) """
+    return np.einsum('ij,sj...->si...', bernstein_matrix(segments.shape[1], samples), segments)
+
+
+def casteljau_samples(bezier_points, t):
+    """ evaluate the Bezier curve at all parameters t at once (de Casteljau scheme on (len(t), points, ...) arrays) """
+    t = np.asarray(t, dtype=float)
+    t = t.reshape(t.shape + (1,) * bezier_points.ndim)
+    points = np.broadcast_to(bezier_points, t.shape[:1] + bezier_points.shape)
+    while points.shape[1] > 1:
+        points = (1 - t) * points[:, :-1] + t * points[:, 1:]
+    return points[:, 0]
+
+
+@lru_cache(maxsize=BASIS_CACHE_SIZE)
+def bernstein_matrix(points_len, n):
+    """ (n+1) x points_len matrix of the Bernstein polynomials at t = i / n
+
+        Built with the recurrence B(j, k) = (1 - t) B(j-1, k) + t B(j-1, k-1), which (unlike
+        binomial coefficients and powers of t) neither overflows nor cancels for high degrees. """
+    t = (np.arange(n + 1) / n)[:, np.newaxis]
+    matrix = np.ones((n + 1, 1))
+    for j in range(1, points_len):
+        next_matrix = np.zeros((n + 1, j + 1))
+        next_matrix[:, :-1] = (1 - t) * matrix
+        next_matrix[:, 1:] += t * matrix
+        matrix = next_matrix
+    matrix.flags.writeable = False
+    return matrix
+
+
+def forward_differences(bezier_points, n):
+    """ evaluate the Bezier curve at t = i / n by forward differencing
+
+        The curve is a polynomial of degree d = len(bezier_points) - 1, so its d-th
+        differences at uniform steps are constant: the first d+1 samples give all
+        start differences, every further sample is a sum of the previous ones.
+        Rounding errors grow with the degree and the number of steps. """
+    d = len(bezier_points) - 1
+    start = casteljau_samples(bezier_points, np.arange(min(d, n) + 1) / n)
+    differences = [start]
+    for k in range(min(d, n)):
+        differences.append(np.diff(differences[-1], axis=0))
+
+    # differences of order k at every step i are the start value plus the sum of order k+1 up to i-1
+    values = np.repeat(differences[-1][:1], n + 1, axis=0)
+    for k in range(len(differences) - 2, -1, -1):
+        values = np.concatenate((differences[k][:1], differences[k][:1] + np.cumsum(values[:-1], axis=0)))
+    return values
+
+
+def bezier_samples(bezier_points, n, method="bernstein"):
+    """ n+1 points of the Bezier curve at uniform parameters (see BEZIER_METHODS) """
+    if method == "forward" and len(bezier_points) - 1 <= FORWARD_MAX_DEGREE:
+        return forward_differences(bezier_points, n)
+    if method in ("bernstein", "forward"):
+        return bernstein_matrix(len(bezier_points), n) @ bezier_points
+    if method == "subdivision":
+        return casteljau_samples(bezier_points, np.arange(n + 1) / n)
+    raise ValueError("unknown Bezier evaluation method %r" % method)
+
+
+def flatten(evaluate, breaks, tolerance, max_depth=MAX_FLATNESS_DEPTH):
+    """ polyline through the curve points evaluate(t) that deviates at most tolerance from the curve
+
+        The parameter intervals between the sorted breaks are halved until the curve points
+        at a quarter, half and three quarters of every interval are within tolerance of the
+        chord. All intervals of one subdivision level are tested in one evaluate call. """
+    breaks = np.asarray(breaks, dtype=float)
+    low, high = breaks[:-1], breaks[1:]
+    break_points = evaluate(breaks)
+    low_points, high_points = break_points[:-1], break_points[1:]
+
+    accepted = [breaks[-1:]]
+    for depth in range(max_depth):
+        if not len(low):
+            break
+        t = low[:, np.newaxis] + (high - low)[:, np.newaxis] * FLATNESS_FRACTIONS
+        points = evaluate(t.ravel()).reshape(t.shape + (-1,))
+        chord = low_points[:, np.newaxis] + (high_points - low_points)[:, np.newaxis] * FLATNESS_FRACTIONS[:, np.newaxis]
+        flat = np.linalg.norm(points - chord, axis=2).max(axis=1) <= tolerance
+        accepted.append(low[flat])
+
+        # split the other intervals at their middle
+        split = ~flat
+        middle, middle_points = t[split, 1], points[split, 1]
+        low, high = np.concatenate((low[split], middle)), np.concatenate((middle, high[split]))
+        low_points = np.concatenate((low_points[split], middle_points))
+        high_points = np.concatenate((middle_points, high_points[split]))
+    accepted.append(low)
+
+    return evaluate(np.sort(np.concatenate(accepted)))
+
+
+def bspline_curve(control_points, degree=3, samples=50, tolerance=None):
+    """ points of the clamped B-spline: samples+1 points at uniform parameters, or a polyline
+        within tolerance of the curve if a tolerance is given; empty if there are too few control points """
+    cps = np.asarray(control_points, dtype=float)
+    knot_vector = clamped_knot_vector(len(cps), degree)
+    if not knot_vector:
+        return np.empty((0,) + cps.shape[1:])
+    if tolerance:
+        knot_vector = np.array(knot_vector, dtype=float)
+        return flatten(lambda t: deboor_samples(degree, cps, knot_vector, t), np.unique(knot_vector), tolerance)
+    columns, weights = basis_matrix(len(cps), degree, samples)
+    return evaluate_basis(columns, weights, cps)
+
+
+def bezier_curve(control_points, samples=50, method="bernstein", tolerance=None):
+    """ points of the Bezier curve: samples+1 points at uniform parameters (see BEZIER_METHODS), or
+        a polyline within tolerance of the curve if a tolerance is given; empty for less than 2 control points """
+    cps = np.asarray(control_points, dtype=float)
+    if len(cps) < 2:
+        return np.empty((0,) + cps.shape[1:])
+    if tolerance:
+        return flatten(lambda t: casteljau_samples(cps, t), np.linspace(0, 1, len(cps)), tolerance)
+    return bezier_samples(cps, samples, method)
+
+
+def evaluate_curve(control_points, mode=1, degree=3, samples=50, method="bernstein", tolerance=None):
+    """ B-spline (mode 1, de Boor) or Bezier curve (mode 0, de Casteljau) as drawn by the viewer """
+    if mode:
+        return bspline_curve(control_points, degree, samples, tolerance)
+    return bezier_curve(control_points, samples, method, tolerance)